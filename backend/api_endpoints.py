@@ -1,16 +1,25 @@
 # api_endpoints.py - 完整路由版本
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+import io
+import json
 import logging
 import time
+from datetime import datetime
 
 from models import TextInput, EmotionResponse, ChatRequest, ChatResponse, ContentItem
 from conversation_manager import conversation_manager
 from emotion_analyzer import emotion_analyzer
 from response_generator import response_generator
 from urgent_detector import urgent_detector, urgent_logger
+from urgent_stream import urgent_broker
+from llm_scheduler import llm_scheduler
+from detection_config import detection_config
+from text_analysis import AnalyzedText
 from content_recommender import content_recommender
-from content_db import content_db
+from content_db import content_db, iter_json_array
 from utils import validate_user_input
 
 logger = logging.getLogger(__name__)
@@ -45,13 +54,19 @@ async def health_check():
         "conversation_manager": "active",
         "session_count": len(conversation_manager.sessions),
         "content_items": len(content_db.content_items),
+        "content_loaded": content_db.is_loaded,
+        "content_version": content_db.version,
+        "recommendation_cache": content_recommender.cache.info(),
+        "urgent_stream_subscribers": urgent_broker.subscriber_count,
+        "llm_scheduler": llm_scheduler.info(),
+        "detection_config_version": detection_config.version,
         "timestamp": time.time()
     }
 
 # ==================== 情绪分析API ====================
 @router.post("/emotion/analyze", response_model=EmotionResponse)
-async def analyze_emotion(input_data: TextInput):
-    """情绪分析API"""
+def analyze_emotion(input_data: TextInput):
+    """情绪分析API（同步端点，在线程池中执行，LLM请求排队时不阻塞事件循环）"""
     if not validate_user_input(input_data.text):
         raise HTTPException(status_code=400, detail="输入文本无效")
     
@@ -70,7 +85,9 @@ async def analyze_emotion(input_data: TextInput):
     )
     
     # 检测紧急情况
-    urgent_issue = urgent_detector.detect(input_data.text, current_emotion)
+    # 只查看会话累积风险，不计入（同一条消息通常还会经过对话接口）
+    session_key = f"{input_data.user_id}_{input_data.session_id}" if input_data.session_id else None
+    urgent_issue = urgent_detector.detect(AnalyzedText(input_data.text), current_emotion, session_key, record=False)
     
     # 分析趋势
     trend = "new"
@@ -86,6 +103,8 @@ async def analyze_emotion(input_data: TextInput):
     # 记录紧急情况
     if urgent_issue['level'] in ['urgent', 'warning_high']:
         logger.warning(f"紧急情况: {urgent_issue['level']}, 用户: {input_data.user_id}")
+        _publish_urgent('emotion_analyze', input_data.user_id, input_data.session_id,
+                        current_emotion, urgent_issue)
     
     return EmotionResponse(
         text=input_data.text,
@@ -98,8 +117,8 @@ async def analyze_emotion(input_data: TextInput):
 
 # ==================== 智能对话API ====================
 @router.post("/chat/intelligent", response_model=ChatResponse)
-async def intelligent_chat(chat_request: ChatRequest):
-    """智能对话API"""
+def intelligent_chat(chat_request: ChatRequest, background_tasks: BackgroundTasks):
+    """智能对话API（同步端点，在线程池中执行，LLM请求排队时不阻塞事件循环）"""
     start_time = time.time()
     
     if not validate_user_input(chat_request.text):
@@ -108,6 +127,9 @@ async def intelligent_chat(chat_request: ChatRequest):
     logger.info(f"智能对话请求: user_id={chat_request.user_id}, session_id={chat_request.session_id}")
     
     try:
+        # 用户文本只分析一次，紧急检测、关切点提取和推荐共用
+        analysis = AnalyzedText(chat_request.text)
+        
         # 1. 获取或创建对话会话
         session = conversation_manager.get_or_create_session(
             chat_request.user_id, chat_request.session_id
@@ -135,10 +157,16 @@ async def intelligent_chat(chat_request: ChatRequest):
         logger.info(f"情绪分析结果: 当前={current_emotion}, 深层={context_emotion}")
         
         # 4. 检测紧急情况
-        urgent_issue = urgent_detector.detect(chat_request.text, current_emotion)
+        urgent_issue = urgent_detector.detect(
+            analysis, current_emotion,
+            session_key=f"{chat_request.user_id}_{chat_request.session_id}"
+        )
         
         if urgent_issue['level'] in ['urgent', 'warning_high']:
             logger.warning(f"紧急情况检测: 级别={urgent_issue['level']}, 触发词={urgent_issue.get('triggers', [])}")
+            # 检测到即推送给咨询师，不等待回复生成
+            _publish_urgent('chat', chat_request.user_id, chat_request.session_id,
+                            current_emotion, urgent_issue)
         
         # 5. 准备历史文本
         history_text = ""
@@ -174,7 +202,7 @@ async def intelligent_chat(chat_request: ChatRequest):
         conversation_manager.add_interaction(
             user_id=chat_request.user_id,
             session_id=chat_request.session_id,
-            user_input=chat_request.text,
+            user_input=analysis,
             emotion=current_emotion,
             ai_response=ai_response
         )
@@ -191,10 +219,13 @@ async def intelligent_chat(chat_request: ChatRequest):
             }
             urgent_logger.log_interaction(interaction_data)
         
-        # 9. 内容推荐
-        recommendations = []
-        recommendation_rationale = ""
+        # LLM异步复核（不阻塞回复），升级时记录并推送；
+        # 只在对话接口发起，同一条消息经过情绪分析接口时不重复复核
+        _confirm_urgent_async('chat', chat_request.user_id, chat_request.session_id,
+                              chat_request.text, current_emotion, urgent_issue, ai_response,
+                              session_key=f"{chat_request.user_id}_{chat_request.session_id}")
         
+        # 9. 内容推荐（回复发送后在后台生成，前端通过 /session/{user_id}/{session_id}/recommendations 获取）
         turn_count = conversation_summary.get('turn_count', 0)
         should_recommend = (
             turn_count >= 2 and 
@@ -203,18 +234,18 @@ async def intelligent_chat(chat_request: ChatRequest):
         )
         
         if should_recommend:
-            try:
-                rec_items, rationale, _ = content_recommender.recommend_content(
-                    user_input=chat_request.text,
-                    current_emotion=current_emotion,
-                    conversation_summary=conversation_summary,
-                    limit=2
-                )
-                recommendations = rec_items
-                recommendation_rationale = rationale
-                logger.info(f"推荐了 {len(recommendations)} 个内容")
-            except Exception as e:
-                logger.error(f"内容推荐失败: {e}")
+            conversation_manager.mark_recommendations_pending(
+                chat_request.user_id, chat_request.session_id, turn_count
+            )
+            background_tasks.add_task(
+                _recommend_in_background,
+                user_id=chat_request.user_id,
+                session_id=chat_request.session_id,
+                turn=turn_count,
+                user_input=analysis,
+                current_emotion=current_emotion,
+                conversation_summary=conversation_summary
+            )
         
         # 10. 获取更新后的对话摘要
         updated_summary = conversation_manager.get_conversation_summary(
@@ -235,14 +266,31 @@ async def intelligent_chat(chat_request: ChatRequest):
                 'key_concerns': updated_summary['key_concerns']
             },
             urgent_issue=urgent_issue,
-            recommendations=recommendations,
-            recommendation_rationale=recommendation_rationale
+            recommendations=[],
+            recommendation_rationale="",
+            recommendations_pending=should_recommend
         )
         
     except Exception as e:
         logger.error(f"智能对话处理失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
+def _recommend_in_background(user_id: str, session_id: str, turn: int, user_input: AnalyzedText,
+                             current_emotion: str, conversation_summary: dict):
+    """后台生成对话内推荐并保存到会话"""
+    try:
+        rec_items, rationale, _, strategy = content_recommender.recommend_content(
+            user_input=user_input,
+            current_emotion=current_emotion,
+            conversation_summary=conversation_summary,
+            limit=2
+        )
+        conversation_manager.set_recommendations(user_id, session_id, turn, rec_items, rationale, strategy)
+        logger.info(f"推荐了 {len(rec_items)} 个内容（{strategy}）")
+    except Exception as e:
+        logger.error(f"内容推荐失败: {e}")
+        conversation_manager.set_recommendations(user_id, session_id, turn, [], "", None, status='failed')
+
 # ==================== 会话管理API ====================
 @router.get("/session/{user_id}/{session_id}/summary")
 async def get_session_summary(user_id: str, session_id: str):
@@ -262,6 +310,19 @@ async def get_session_summary(user_id: str, session_id: str):
         "active": True
     }
 
+@router.get("/session/{user_id}/{session_id}/recommendations")
+async def get_session_recommendations(user_id: str, session_id: str):
+    """获取会话最近一次推荐（status: none / pending / ready / failed）"""
+    recommendations = conversation_manager.get_recommendations(user_id, session_id)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        **recommendations
+    }
+
 @router.delete("/session/{user_id}/{session_id}")
 async def clear_session(user_id: str, session_id: str):
     """清除会话"""
@@ -269,18 +330,109 @@ async def clear_session(user_id: str, session_id: str):
     if key in conversation_manager.sessions:
         del conversation_manager.sessions[key]
         logger.info(f"会话已清除: {key}")
+    urgent_detector.reset_session(key)
     return {"message": "会话已清除"}
 
 # ==================== 紧急情况管理API ====================
 @router.get("/urgent/cases")
-async def get_recent_urgent_cases(days: int = 1, level: Optional[str] = None):
-    """获取最近的紧急情况记录"""
+def get_recent_urgent_cases(days: int = 1, level: Optional[str] = None,
+                            user_id: Optional[str] = None,
+                            since: Optional[datetime] = None, until: Optional[datetime] = None,
+                            min_risk_score: Optional[float] = None,
+                            limit: int = 100, cursor: Optional[str] = None):
+    """
+    获取最近的紧急情况记录（支持按等级、用户、时间范围、风险分过滤和游标分页）
+    
+    查询会等待日志写入、首次使用时构建索引，并可能读取压缩日志，因此在线程池中执行。
+    """
     if days > 30:  # 限制查询天数
         days = 30
+    days = max(days, 1)
+    limit = max(1, min(limit, 100))
     
-    result = urgent_logger.get_recent_cases(days, level)
+    try:
+        result = urgent_logger.get_recent_cases(
+            days, level, user_id,
+            since=_local_isoformat(since), until=_local_isoformat(until),
+            min_risk_score=min_risk_score, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return result
 
+def _local_isoformat(value: Optional[datetime]) -> Optional[str]:
+    """转换为与日志时间戳一致的本地时间ISO字符串"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+@router.get("/urgent/stream")
+async def stream_urgent_cases(level: Optional[str] = None,
+                              last_event_id: Optional[int] = Header(None)):
+    """紧急情况实时推送（Server-Sent Events），重连时按 Last-Event-ID 补发近期事件"""
+    subscription = urgent_broker.subscribe(level, last_event_id)
+    return StreamingResponse(
+        urgent_broker.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _publish_urgent(source: str, user_id: str, session_id: Optional[str],
+                    emotion: str, urgent_issue: Dict):
+    """推送紧急情况事件"""
+    urgent_broker.publish({
+        'source': source,
+        'timestamp': datetime.now().isoformat(),
+        'user_id': user_id,
+        'session_id': session_id,
+        'urgent_level': urgent_issue['level'],
+        'triggers': urgent_issue.get('triggers', []),
+        'risk_score': urgent_issue.get('risk_score', 0.0),
+        'previous_level': urgent_issue.get('previous_level'),
+        'confirmed_by': urgent_issue.get('confirmed_by', 'rules'),
+        'emotion': emotion
+    })
+
+def _confirm_urgent_async(source: str, user_id: str, session_id: Optional[str], text: str,
+                          emotion: str, urgent_issue: Dict, ai_response: str = "",
+                          session_key: Optional[str] = None):
+    """提交LLM复核；判定升级为 urgent/warning_high 时写入紧急日志并推送给咨询师"""
+    def on_upgrade(upgraded: Dict):
+        if upgraded['level'] not in ['urgent', 'warning_high']:
+            return
+        urgent_logger.log_interaction({
+            'user_id': user_id,
+            'session_id': session_id,
+            'user_input': text,
+            'emotion': emotion,
+            'ai_response': ai_response,
+            'urgent_issue': upgraded
+        })
+        _publish_urgent(source, user_id, session_id, emotion, upgraded)
+    
+    urgent_detector.schedule_confirmation(text, emotion, urgent_issue, on_upgrade, session_key)
+
+@router.get("/detection-config")
+async def get_detection_config():
+    """当前检测规则的版本信息"""
+    return detection_config.info()
+
+@router.post("/detection-config/reload")
+def reload_detection_config():
+    """从文件重新加载检测规则（校验通过后原子替换，不阻塞检测）"""
+    if not detection_config.load():
+        raise HTTPException(status_code=409, detail=f"检测配置未更新: {detection_config.last_error or '版本号未变化'}")
+    return detection_config.info()
+
+@router.post("/detection-config/rollback")
+def rollback_detection_config():
+    """回滚到上一个版本的检测规则"""
+    if not detection_config.rollback():
+        raise HTTPException(status_code=409, detail="没有可回滚的版本")
+    return detection_config.info()
+
 @router.get("/resources/emergency")
 async def get_emergency_resources():
     """获取紧急求助资源"""
@@ -314,14 +466,14 @@ async def get_emergency_resources():
 
 # ==================== 内容推荐API ====================
 @router.post("/content/recommend")
-async def recommend_content(
+def recommend_content(
     user_input: str,
     current_emotion: str,
     conversation_stage: str,
     key_concerns: Optional[str] = None,
     limit: int = 3
 ):
-    """个性化内容推荐API"""
+    """个性化内容推荐API（同步端点，在线程池中执行；等待AI重排期间不阻塞事件循环）"""
     try:
         # 构建对话摘要
         conversation_summary = {
@@ -331,7 +483,7 @@ async def recommend_content(
             'recent_emotions': [current_emotion]
         }
         
-        recommendations, rationale, match_scores = content_recommender.recommend_content(
+        recommendations, rationale, match_scores, strategy = content_recommender.recommend_content(
             user_input=user_input,
             current_emotion=current_emotion,
             conversation_summary=conversation_summary,
@@ -341,7 +493,8 @@ async def recommend_content(
         return {
             "recommendations": recommendations,
             "rationale": rationale,
-            "match_scores": match_scores
+            "match_scores": match_scores,
+            "strategy": strategy
         }
         
     except Exception as e:
@@ -349,20 +502,122 @@ async def recommend_content(
         raise HTTPException(status_code=500, detail="内容推荐失败")
 
 @router.get("/content/search")
-async def search_content(q: str, limit: int = 10):
-    """搜索内容"""
+async def search_content(q: str, limit: int = 10, cursor: Optional[str] = None):
+    """搜索内容（支持游标分页）"""
     if not q or len(q.strip()) < 2:
         raise HTTPException(status_code=400, detail="搜索关键词太短")
+    limit = max(1, min(limit, 100))
     
-    results = content_db.search_content(q, limit)
+    try:
+        results, next_cursor = content_db.search_content_page(q, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "query": q,
         "results": results,
-        "count": len(results)
+        "count": len(results),
+        "next_cursor": next_cursor
     }
 
+@router.get("/content/suggest")
+async def suggest_content(prefix: str, limit: int = 8):
+    """标题和标签的前缀联想（输入提示）"""
+    prefix = prefix.strip()
+    if not prefix:
+        return {"prefix": prefix, "suggestions": []}
+    limit = max(1, min(limit, 10))
+    return {
+        "prefix": prefix,
+        "suggestions": content_db.suggest(prefix, limit)
+    }
+
+@router.get("/content")
+async def list_content(cursor: Optional[str] = None, limit: int = 20,
+                       type: Optional[str] = None, category: Optional[str] = None):
+    """游标分页浏览内容目录"""
+    limit = max(1, min(limit, 100))
+    try:
+        items, next_cursor = content_db.list_content(cursor, limit, type, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "items": items,
+        "count": len(items),
+        "next_cursor": next_cursor
+    }
+
+@router.get("/content/export")
+async def export_content(type: Optional[str] = None, category: Optional[str] = None):
+    """以NDJSON流式导出内容目录，服务端内存占用与目录大小无关"""
+    def generate():
+        for item in content_db.iter_content(type, category):
+            yield content_db.to_json_line(item) + "\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="content_export.ndjson"'}
+    )
+
+@router.post("/content/bulk")
+async def bulk_import_content(request: Request, atomic: bool = False):
+    """
+    批量导入内容
+    
+    请求体为ContentItem的JSON数组，或NDJSON（Content-Type: application/x-ndjson）。
+    atomic=true 时任意一行失败则整批不导入。
+    解析、校验、重建索引和保存文件在线程池中执行，不阻塞事件循环。
+    """
+    body = await request.body()
+    return await run_in_threadpool(_bulk_import, body, request.headers.get('content-type', ''), atomic)
+
+def _bulk_import(raw_body: bytes, content_type: str, atomic: bool) -> Dict:
+    """解析请求体并导入内容（同步执行）"""
+    try:
+        body = raw_body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="请求体必须是UTF-8编码")
+    
+    parse_errors = []
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        rows = []
+        for row, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append((row, json.loads(line)))
+            except json.JSONDecodeError as e:
+                parse_errors.append({"row": row, "id": None, "error": f"JSON格式错误: {e.msg}"})
+    else:
+        try:
+            rows = list(enumerate(iter_json_array(io.StringIO(body)), start=1))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"JSON格式错误: {e}")
+    
+    result = content_db.bulk_import(rows, atomic=atomic, dry_run=atomic and bool(parse_errors))
+    if parse_errors:
+        result["failed"] += len(parse_errors)
+        result["errors"] = sorted(parse_errors + result["errors"], key=lambda e: e["row"])
+    return result
+
+@router.post("/content/reload")
+def reload_content():
+    """从文件重新加载内容目录（后台构建，原子替换，不阻塞读请求）"""
+    if not content_db.reload():
+        raise HTTPException(status_code=409, detail="内容目录重新加载失败或正在进行中")
+    return {
+        "message": "内容目录已重新加载",
+        "version": content_db.version,
+        "content_items": len(content_db.content_items)
+    }
+
+@router.get("/content/stats")
+async def get_content_stats():
+    """获取内容统计信息"""
+    return content_db.get_stats()
+
 @router.get("/content/{content_id}")
-async def get_content_detail(content_id: str):
+def get_content_detail(content_id: str):
     """获取内容详情"""
     content_item = content_db.get_content_by_id(content_id)
     if not content_item:
@@ -372,29 +627,3 @@ async def get_content_detail(content_id: str):
     content_db.increment_popularity(content_id)
     
     return content_item
-
-@router.get("/content/stats")
-async def get_content_stats():
-    """获取内容统计信息"""
-    all_content = content_db.get_all_content()
-    
-    stats = {
-        "total_count": len(all_content),
-        "by_type": {},
-        "by_category": {},
-        "top_popular": []
-    }
-    
-    # 按类型统计
-    for item in all_content:
-        stats["by_type"][item.type] = stats["by_type"].get(item.type, 0) + 1
-        stats["by_category"][item.category] = stats["by_category"].get(item.category, 0) + 1
-    
-    # 热门内容
-    sorted_by_popularity = sorted(all_content, key=lambda x: x.popularity, reverse=True)[:10]
-    stats["top_popular"] = [
-        {"id": item.id, "title": item.title, "popularity": item.popularity}
-        for item in sorted_by_popularity
-    ]
-    
-    return stats
\ No newline at end of file
@@ -0,0 +1,42 @@
+import logging
+import os
+
+from fastapi import FastAPI
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class AssetFiles(StaticFiles):
+    """
+    内容资源文件（音频、文档等）
+
+    基于 StaticFiles/FileResponse：
+    - 支持 Range 请求（音频拖动进度），单段返回206，越界返回416
+    - 带 ETag/Last-Modified，If-None-Match/If-Modified-Since 命中时返回304
+    - 文件体由服务器直接发送（支持 pathsend 扩展时零拷贝），不经过Python读入内存
+    """
+
+    def __init__(self, directory: str, max_age: int = 0):
+        super().__init__(directory=directory)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.max_age:
+            response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
+
+
+def mount_assets(app: FastAPI):
+    """按 ContentItem.url 的路径前缀挂载资源目录，如 /audios/xxx.mp3 -> {ASSET_DIR}/audios/xxx.mp3"""
+    for prefix in config.ASSET_PREFIXES:
+        directory = os.path.join(config.ASSET_DIR, prefix)
+        os.makedirs(directory, exist_ok=True)
+        app.mount(f"/{prefix}", AssetFiles(directory, config.ASSET_CACHE_MAX_AGE), name=f"assets-{prefix}")
+        logger.info(f"资源目录已挂载: /{prefix} -> {directory}")
@@ -0,0 +1,312 @@
+# benchmark.py - 推荐与检索的离线基准测试
+"""
+离线基准测试与查询回放
+
+生成 1k / 10k / 100k 条的合成内容目录，把一组 (用户输入, 情绪, 对话摘要) 查询
+依次回放到 _rule_based_recommendation、search_content 和 recommend_content，
+报告每次调用的延迟分位数、目录加载耗时与进程内存，以及相对标注目标的命中率。
+recommend_content[cached] 不清空推荐缓存，命中率反映按 (情绪, 阶段, 关切点) 复用结果的代价。
+LLM 调用被替换为本地桩（按候选顺序返回），不需要网络。
+
+用法（在 backend 目录下）:
+    python benchmark.py
+    python benchmark.py --sizes 1000 10000 --queries my_queries.jsonl --json result.json
+
+查询文件为 JSONL，每行包含 user_input、current_emotion、conversation_summary，
+以及 target_ids 或 target_categories（结果命中其中任一即算命中）。
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+# 必须在导入后端模块之前设置：使用临时目录，不监视文件，不需要真实的API密钥
+_WORK_DIR = tempfile.mkdtemp(prefix="mindpal-bench-")
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+os.environ["CONTENT_DB_FILE"] = os.path.join(_WORK_DIR, "content_db.json")
+os.environ["CONTENT_WATCH_INTERVAL"] = "0"
+os.environ["CONTENT_BACKGROUND_LOAD"] = "false"
+os.environ.setdefault("LOG_DIR", os.path.join(_WORK_DIR, "logs"))
+
+# 合成目录的主题：分类、标题用词、标签、情绪标签，以及带标注的查询（含不直接命中标签的说法）
+TOPICS = {
+    "academic": {
+        "words": ["学业压力", "考试", "复习", "时间管理", "拖延"],
+        "tags": ["学业压力", "考试焦虑", "学习方法", "时间管理"],
+        "emotions": ["学业压力", "压力", "焦虑"],
+        "queries": ["下周就要考试了，复习不完", "论文写不出来，压力好大", "总是拖延，作业做不完"],
+        "concerns": ["academic"],
+    },
+    "sleep": {
+        "words": ["睡眠", "失眠", "入睡", "放松", "冥想"],
+        "tags": ["睡眠", "失眠", "放松", "冥想"],
+        "emotions": ["失眠", "焦虑", "压力"],
+        "queries": ["最近总是睡不着", "晚上翻来覆去到三点", "失眠好几天了，白天没精神"],
+        "concerns": [],
+    },
+    "relationship": {
+        "words": ["人际关系", "沟通", "室友", "朋友", "冲突"],
+        "tags": ["人际关系", "沟通技巧", "室友矛盾", "社交"],
+        "emotions": ["人际矛盾", "愤怒", "孤独"],
+        "queries": ["和室友吵架了", "朋友好像都不理我了", "不知道怎么和家人沟通"],
+        "concerns": ["relationship"],
+    },
+    "mindfulness": {
+        "words": ["正念", "呼吸", "焦虑缓解", "情绪调节", "身体扫描"],
+        "tags": ["正念", "呼吸练习", "焦虑缓解", "情绪调节"],
+        "emotions": ["焦虑", "压力", "紧张"],
+        "queries": ["心里一直很慌，静不下来", "焦虑的时候心跳很快", "想学点让自己平静下来的方法"],
+        "concerns": [],
+    },
+    "anger_management": {
+        "words": ["愤怒", "情绪管理", "冷静", "冲动", "控制"],
+        "tags": ["愤怒管理", "情绪调节", "冷静技巧"],
+        "emotions": ["愤怒", "烦躁"],
+        "queries": ["一点小事就想发火", "控制不住脾气，事后又后悔", "气得不行"],
+        "concerns": [],
+    },
+    "career_planning": {
+        "words": ["未来", "职业规划", "方向", "选择", "就业"],
+        "tags": ["职业规划", "未来迷茫", "决策"],
+        "emotions": ["未来迷茫", "不确定", "困惑"],
+        "queries": ["不知道毕业以后做什么", "对未来很迷茫", "考研还是工作，选不出来"],
+        "concerns": ["future"],
+    },
+    "self_esteem": {
+        "words": ["自信", "自我接纳", "自我怀疑", "优点", "成长"],
+        "tags": ["自信", "自我接纳", "自我价值"],
+        "emotions": ["自我怀疑", "抑郁"],
+        "queries": ["觉得自己什么都做不好", "总觉得比不上别人", "很讨厌现在的自己"],
+        "concerns": ["self"],
+    },
+    "mood_management": {
+        "words": ["情绪低落", "抑郁", "心情", "陪伴", "倾诉"],
+        "tags": ["情绪低落", "心情调节", "自我关怀"],
+        "emotions": ["抑郁", "孤独"],
+        "queries": ["最近提不起劲，什么都不想做", "心情一直很低落", "一个人的时候特别难受"],
+        "concerns": [],
+    },
+}
+
+CONTENT_TYPES = ["article", "audio", "video", "exercise", "tool"]
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+STAGES = ["initial", "exploring", "deepening", "resolving"]
+
+
+def generate_catalog(size: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """生成合成内容目录"""
+    topics = list(TOPICS)
+    created_at = datetime.now().isoformat()
+    catalog = []
+    for i in range(size):
+        category = rng.choice(topics)
+        topic = TOPICS[category]
+        title_words = rng.sample(topic["words"], 2)
+        catalog.append({
+            "id": f"bench_{i:06d}",
+            "title": f"{title_words[0]}与{title_words[1]}（第{i}期）",
+            "type": rng.choice(CONTENT_TYPES),
+            "category": category,
+            "description": f"关于{'、'.join(topic['words'][:3])}的内容。",
+            "url": f"/bench/{i}",
+            "duration_minutes": rng.choice([None, 5, 10, 15]),
+            "tags": rng.sample(topic["tags"], min(2, len(topic["tags"]))) + [rng.choice(["大学生", "心理健康", "自助"])],
+            "emotion_tags": rng.sample(topic["emotions"], min(2, len(topic["emotions"]))),
+            "difficulty": rng.choice(DIFFICULTIES),
+            "created_at": created_at,
+            "popularity": int(rng.paretovariate(1.5)) - 1,
+        })
+    return catalog
+
+
+def generate_queries(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """生成带标注目标（主题分类）的查询"""
+    queries = []
+    for _ in range(count):
+        category = rng.choice(list(TOPICS))
+        topic = TOPICS[category]
+        queries.append({
+            "user_input": rng.choice(topic["queries"]),
+            "current_emotion": rng.choice(topic["emotions"]),
+            "conversation_summary": {
+                "conversation_stage": rng.choice(STAGES),
+                "key_concerns": list(topic["concerns"]),
+                "turn_count": 5,
+                "recent_emotions": [],
+            },
+            "target_categories": [category],
+        })
+    return queries
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_hit(items: List[Any], query: Dict[str, Any]) -> bool:
+    """结果中是否有标注目标"""
+    target_ids = set(query.get("target_ids", []))
+    target_categories = set(query.get("target_categories", []))
+    return any(item.id in target_ids or item.category in target_categories for item in items)
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB），仅Linux可用，其他平台返回0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB），不支持的平台返回0"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / 1024 / 1024
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def measure(name: str, queries: List[Dict[str, Any]], call: Callable[[Dict[str, Any]], List[Any]]) -> Dict[str, Any]:
+    """回放查询，统计延迟分位数和命中率"""
+    latencies, hits = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        items = call(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += is_hit(items, query)
+    latencies.sort()
+    return {
+        "name": name,
+        "calls": len(queries),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+        "hit_rate": hits / len(queries) if queries else 0.0,
+    }
+
+
+def stub_llm(recommender, latency_ms: float):
+    """用本地桩替换推荐器的LLM客户端：按候选顺序返回ID"""
+    def create(**kwargs):
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        prompt = kwargs["messages"][-1]["content"]
+        candidates = json.loads(prompt.split("候选内容:", 1)[1])
+        content = json.dumps({"ids": [candidate["id"] for candidate in candidates]})
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+    recommender.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+    )
+
+
+def run_size(size: int, queries: List[Dict[str, Any]], limit: int, seed: int) -> Dict[str, Any]:
+    from content_db import content_db
+    from content_recommender import content_recommender
+
+    with open(content_db.data_file, 'w', encoding='utf-8') as f:
+        json.dump(generate_catalog(size, random.Random(seed)), f, ensure_ascii=False)
+
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    content_db.reload()
+    load_seconds = time.perf_counter() - start
+    gc.collect()
+    rss_after = rss_mb()
+
+    def rule_based(query):
+        return content_recommender._rule_based_recommendation(
+            query["user_input"], query["current_emotion"], query["conversation_summary"], limit
+        )
+
+    def search(query):
+        return content_db.search_content(query["user_input"], limit=limit)
+
+    def recommend(query, cached=False):
+        if not cached:
+            content_recommender.cache.clear()
+        items, _, _, _ = content_recommender.recommend_content(
+            user_input=query["user_input"],
+            current_emotion=query["current_emotion"],
+            conversation_summary=query["conversation_summary"],
+            limit=limit
+        )
+        return items
+
+    return {
+        "size": size,
+        "load_seconds": load_seconds,
+        "rss_mb": rss_after,
+        "rss_delta_mb": rss_after - rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "results": [
+            measure("_rule_based_recommendation", queries, rule_based),
+            measure("search_content", queries, search),
+            measure("recommend_content", queries, recommend),
+            measure("recommend_content[cached]", queries, lambda query: recommend(query, cached=True)),
+        ],
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n== {report['size']} 条内容: 加载 {report['load_seconds']:.2f}s, "
+          f"常驻内存 {report['rss_mb']:.1f}MB (加载 {report['rss_delta_mb']:+.1f}MB, 进程峰值 {report['peak_rss_mb']:.1f}MB)")
+    print(f"{'调用':<30}{'次数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'命中率':>8}")
+    for row in report["results"]:
+        print(f"{row['name']:<30}{row['calls']:>6}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+              f"{row['p99_ms']:>10.3f}{row['max_ms']:>10.3f}{row['hit_rate']:>8.1%}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="MindPal 推荐与检索离线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="目录规模")
+    parser.add_argument("--queries", help="查询回放文件（JSONL），默认生成合成查询")
+    parser.add_argument("--num-queries", type=int, default=200, help="合成查询数量")
+    parser.add_argument("--limit", type=int, default=3, help="每次推荐/检索的数量")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="LLM桩的模拟延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="把结果写入JSON文件，便于比较")
+    args = parser.parse_args(argv)
+
+    # 后端模块在设置好环境变量后导入
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from content_recommender import content_recommender
+    stub_llm(content_recommender, args.llm_latency)
+
+    queries = load_queries(args.queries) if args.queries else generate_queries(args.num_queries, random.Random(args.seed))
+
+    reports = []
+    for size in args.sizes:
+        report = run_size(size, queries, args.limit, args.seed)
+        print_report(report)
+        reports.append(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"queries": len(queries), "limit": args.limit, "reports": reports}, f,
+                      ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
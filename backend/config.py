@@ -18,6 +18,13 @@ class Config:
     CHAT_MODEL: str = os.getenv("CHAT_MODEL", "deepseek-chat")
     API_BASE_URL: str = os.getenv("API_BASE_URL", "https://api.deepseek.com/v1")
     
+    # LLM请求调度配置（按优先级分配并发：危机回应 > 对话与情绪分析 > 推荐等后台任务）
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # 同时进行的LLM请求总数上限
+    LLM_QUOTA_CRISIS: int = int(os.getenv("LLM_QUOTA_CRISIS", "16"))  # 危机回应的并发配额
+    LLM_QUOTA_INTERACTIVE: int = int(os.getenv("LLM_QUOTA_INTERACTIVE", "10"))  # 对话回复、情绪分析、风险复核的并发配额
+    LLM_QUOTA_BACKGROUND: int = int(os.getenv("LLM_QUOTA_BACKGROUND", "3"))  # 推荐等后台任务的并发配额（与上一项之和须小于总并发上限）
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # 排队等待的最长时间（秒）
+    
     # 服务器配置
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
@@ -35,6 +42,45 @@ class Config:
     
     # 内容数据库配置
     CONTENT_DB_FILE: str = os.getenv("CONTENT_DB_FILE", "data/content_db.json")
+    CONTENT_BACKGROUND_LOAD: bool = os.getenv("CONTENT_BACKGROUND_LOAD", "false").lower() == "true"  # 后台加载内容库，启动时不阻塞
+    CONTENT_WATCH_INTERVAL: float = float(os.getenv("CONTENT_WATCH_INTERVAL", "5"))  # 内容文件变更检查间隔（秒），0表示不监视
+    CONTENT_POPULARITY_FILE: str = os.getenv("CONTENT_POPULARITY_FILE", "data/content_popularity.json")  # 浏览计数单独保存，内容文件只由编辑维护
+    CONTENT_POPULARITY_FLUSH_INTERVAL: float = float(os.getenv("CONTENT_POPULARITY_FLUSH_INTERVAL", "5"))  # 浏览计数合并写入目录的间隔（秒），0表示立即写入
+    
+    # 内容资源文件配置（ContentItem.url 指向的音频、文档等）
+    ASSET_DIR: str = os.getenv("ASSET_DIR", "data/assets")
+    ASSET_PREFIXES: List[str] = [p.strip() for p in os.getenv("ASSET_PREFIXES", "articles,audios,videos,exercises,tools").split(",") if p.strip()]
+    ASSET_CACHE_MAX_AGE: int = int(os.getenv("ASSET_CACHE_MAX_AGE", "86400"))  # 资源文件浏览器缓存时间（秒）
+    
+    # 推荐配置
+    RECOMMEND_CANDIDATES: int = int(os.getenv("RECOMMEND_CANDIDATES", "12"))  # 本地召回后交给AI重排的候选数
+    RECOMMEND_TABLE_SIZE: int = int(os.getenv("RECOMMEND_TABLE_SIZE", "50"))  # 每个(情绪, 对话阶段)预计算的候选数
+    RECOMMEND_CACHE_SIZE: int = int(os.getenv("RECOMMEND_CACHE_SIZE", "1024"))  # 推荐缓存最大条目数
+    RECOMMEND_CACHE_TTL: float = float(os.getenv("RECOMMEND_CACHE_TTL", "300"))  # 推荐缓存有效期（秒）
+    RECOMMEND_AI_DEADLINE: float = float(os.getenv("RECOMMEND_AI_DEADLINE", "1.5"))  # 等待AI重排的最长时间（秒），超时返回规则推荐
+    RECOMMEND_AI_REQUEST_TIMEOUT: float = float(os.getenv("RECOMMEND_AI_REQUEST_TIMEOUT", "20"))  # AI重排请求本身的超时（秒）
+    RECOMMEND_AI_WORKERS: int = int(os.getenv("RECOMMEND_AI_WORKERS", "4"))  # 后台AI重排线程数
+    
+    # 检测规则配置（关键词、情绪增强因子、关切点、情绪到内容的映射），修改后自动热加载
+    DETECTION_CONFIG_FILE: str = os.getenv("DETECTION_CONFIG_FILE", "data/detection_config.json")
+    DETECTION_CONFIG_WATCH_INTERVAL: float = float(os.getenv("DETECTION_CONFIG_WATCH_INTERVAL", "5"))  # 配置文件变更检查间隔（秒），0表示不监视
+    
+    # 紧急情况检测配置
+    URGENT_RISK_HALF_LIFE: float = float(os.getenv("URGENT_RISK_HALF_LIFE", "1800"))  # 会话累积风险的衰减半衰期（秒）
+    URGENT_CUMULATIVE_HIGH: float = float(os.getenv("URGENT_CUMULATIVE_HIGH", "5.5"))  # 累积风险达到该值时 warning 升级为 warning_high
+    URGENT_CONFIRM_ENABLED: bool = os.getenv("URGENT_CONFIRM_ENABLED", "true").lower() == "true"  # 是否用LLM异步复核 warning 和边缘消息
+    URGENT_CONFIRM_TIMEOUT: float = float(os.getenv("URGENT_CONFIRM_TIMEOUT", "10"))  # LLM复核请求的超时（秒）
+    URGENT_CONFIRM_MIN_RISK: float = float(os.getenv("URGENT_CONFIRM_MIN_RISK", "1.0"))  # 无关键词的消息在会话累积风险达到该值时也复核
+    URGENT_CONFIRM_WORKERS: int = int(os.getenv("URGENT_CONFIRM_WORKERS", "2"))  # LLM复核线程数
+    URGENT_CONFIRM_QUEUE_SIZE: int = int(os.getenv("URGENT_CONFIRM_QUEUE_SIZE", "32"))  # 等待中的复核上限，超出时丢弃并记录日志
+    
+    # 紧急情况日志配置
+    URGENT_INDEX_DAYS: int = int(os.getenv("URGENT_INDEX_DAYS", "30"))  # 内存索引覆盖的天数，更早的记录查询时从日志流式读取
+    URGENT_LOG_ROTATE_INTERVAL: float = float(os.getenv("URGENT_LOG_ROTATE_INTERVAL", "3600"))  # 检查并压缩已结束日期日志的间隔（秒）
+    
+    # 紧急情况推送配置
+    URGENT_STREAM_BUFFER: int = int(os.getenv("URGENT_STREAM_BUFFER", "100"))  # 每个订阅者最多缓冲的事件数，超出丢弃最旧的
+    URGENT_STREAM_HEARTBEAT: float = float(os.getenv("URGENT_STREAM_HEARTBEAT", "15"))  # 无事件时发送心跳的间隔（秒）
     
     def validate(self):
         """验证配置"""
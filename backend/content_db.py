@@ -1,37 +1,384 @@
+import heapq
 import json
 import os
-from typing import List, Dict, Optional
+import threading
+from collections import Counter
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 from datetime import datetime
 from models import ContentItem
 import logging
+from pydantic import ValidationError
 from pydantic.json import pydantic_encoder
+from config import config
+from utils import FileWatcher, encode_cursor, decode_cursor, record_field
+from content_stats import ContentStats
+from content_suggest import ContentSuggestIndex
 
 logger = logging.getLogger(__name__)
 
+
+def iter_json_array(fp: TextIO, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    流式解析顶层JSON数组，逐个产出数组元素
+
+    每次只在缓冲区中保留尚未解析的部分，大文件无需整体读入内存。
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        # 跳过空白和分隔符
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or not fill():
+                break
+
+        if pos >= len(buffer):
+            raise json.JSONDecodeError("内容文件意外结束", buffer, pos)
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise json.JSONDecodeError("内容文件顶层必须是JSON数组", buffer, pos)
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # 元素被缓冲区截断，继续读取后重试
+            if eof or not fill():
+                raise
+            continue
+        if end == len(buffer) and not eof and fill():
+            # 数字等标量可能恰好在缓冲区末尾被截断，补齐后重新解析
+            continue
+        pos = end
+        yield value
+
+
+def _build_item(record: Dict[str, Any]) -> ContentItem:
+    """将原始记录校验为ContentItem"""
+    item_data = dict(record)
+    # 处理datetime字符串
+    if 'created_at' in item_data and isinstance(item_data['created_at'], str):
+        try:
+            item_data['created_at'] = datetime.fromisoformat(item_data['created_at'])
+        except:
+            item_data['created_at'] = datetime.now()
+    return ContentItem(**item_data)
+
+
+def _is_well_formed(record: Dict[str, Any]) -> bool:
+    """
+    快速检查原始记录的字段类型
+
+    通过检查的记录一定能通过ContentItem校验，可以延迟构建模型；
+    未通过的（需要类型转换或确实无效）在加载时立即完整校验。
+    """
+    for name in ('id', 'title', 'type', 'category', 'description'):
+        if not isinstance(record.get(name), str):
+            return False
+    for name in ('url', 'difficulty'):
+        if record.get(name) is not None and not isinstance(record[name], str):
+            return False
+    if 'created_at' in record and not isinstance(record['created_at'], str):
+        return False
+    for name in ('tags', 'emotion_tags'):
+        values = record.get(name, [])
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            return False
+    if record.get('duration_minutes') is not None and type(record['duration_minutes']) is not int:
+        return False
+    return type(record.get('popularity', 0)) is int
+
+
+class LazyContentMap(MutableMapping):
+    """
+    内容项映射
+
+    加载时只保存原始记录，首次访问某个内容项时才构建ContentItem模型。
+    字段类型不符合快速检查的记录在写入时完整校验，校验失败的记录被跳过
+    （不计入长度、不参与遍历和建索引，但保留原始数据，保存时原样写回）。
+    """
+
+    def __init__(self):
+        self._records: Dict[str, Any] = {}  # id -> 原始dict 或 ContentItem
+        self._invalid = set()
+        # 插入顺序（只追加，删除留空位），用于游标分页和不复制的遍历
+        self._order: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}
+
+    def set_raw(self, content_id: str, record: Dict[str, Any]):
+        """写入原始记录：通过快速检查的延迟校验，其余立即校验"""
+        self._track(content_id)
+        self._invalid.discard(content_id)
+        if _is_well_formed(record):
+            self._records[content_id] = record
+            return
+        try:
+            self._records[content_id] = _build_item(record)
+        except ValidationError as e:
+            logger.error(f"内容项校验失败 {content_id}: {e}")
+            self._records[content_id] = record
+            self._invalid.add(content_id)
+
+    def copy(self) -> "LazyContentMap":
+        """复制映射本身（内容项对象共享），写操作在副本上进行"""
+        clone = LazyContentMap()
+        clone._records = dict(self._records)
+        clone._invalid = set(self._invalid)
+        clone._order = list(self._order)
+        clone._positions = dict(self._positions)
+        return clone
+
+    def add_popularity(self, content_id: str, delta: int):
+        """增加有效内容项的热度（只用于尚未发布的新映射，原始记录原地修改）"""
+        record = self._records.get(content_id)
+        if record is None or content_id in self._invalid:
+            return
+        if isinstance(record, ContentItem):
+            self._records[content_id] = record.copy(update={'popularity': record.popularity + delta})
+        else:
+            record['popularity'] = record.get('popularity', 0) + delta
+
+    def position_of(self, content_id: str) -> Optional[int]:
+        """内容项在插入顺序中的位置"""
+        return self._positions.get(content_id)
+
+    def iter_from(self, position: int = 0) -> Iterator[Tuple[int, ContentItem]]:
+        """
+        从指定位置开始按插入顺序遍历有效内容项，产出 (位置, 内容项)
+
+        按下标逐个读取，遍历期间有新内容追加也不会出错。
+        """
+        while position < len(self._order):
+            content_id = self._order[position]
+            if content_id is not None:
+                try:
+                    yield position, self[content_id]
+                except KeyError:
+                    pass
+            position += 1
+
+    def _track(self, content_id: str):
+        if content_id not in self._positions:
+            self._positions[content_id] = len(self._order)
+            self._order.append(content_id)
+
+    def raw_records(self) -> Iterator[Any]:
+        """遍历所有记录（含校验失败的原始数据），用于保存"""
+        return iter(self._records.values())
+
+    def valid_records(self) -> Iterator[Any]:
+        """遍历有效内容项的记录（原始dict或ContentItem，不触发模型构建），用于建索引"""
+        for content_id, record in self._records.items():
+            if content_id not in self._invalid:
+                yield record
+
+    def __getitem__(self, content_id: str) -> ContentItem:
+        record = self._records[content_id]
+        if isinstance(record, ContentItem):
+            return record
+        if content_id in self._invalid:
+            raise KeyError(content_id)
+        try:
+            item = _build_item(record)
+        except ValidationError as e:
+            logger.error(f"内容项校验失败 {content_id}: {e}")
+            self._invalid.add(content_id)
+            raise KeyError(content_id)
+        self._records[content_id] = item
+        return item
+
+    def __setitem__(self, content_id: str, item: ContentItem):
+        self._track(content_id)
+        self._records[content_id] = item
+        self._invalid.discard(content_id)
+
+    def __delitem__(self, content_id: str):
+        del self._records[content_id]
+        self._invalid.discard(content_id)
+        self._order[self._positions.pop(content_id)] = None
+
+    def __iter__(self) -> Iterator[str]:
+        return (content_id for content_id in self._records if content_id not in self._invalid)
+
+    def __len__(self) -> int:
+        return len(self._records) - len(self._invalid)
+
+    def __contains__(self, content_id) -> bool:
+        return content_id in self._records and content_id not in self._invalid
+
+    def values(self) -> Iterator[ContentItem]:
+        """遍历所有有效内容项（跳过校验失败的记录）"""
+        for _, item in self.iter_from(0):
+            yield item
+
+
+class CatalogSnapshot:
+    """
+    内容目录快照
+    
+    内容项与其全部索引作为一个整体发布，发布后不再修改：热加载、添加内容和热度变化
+    都在副本上完成，再替换快照引用。读取方在一次调用内持有同一个快照，
+    不会看到新旧混合或写了一半的状态。
+    """
+    
+    def __init__(self, items: LazyContentMap, indexes: Dict[str, Any]):
+        self.items = items
+        self.indexes = indexes
+    
+    @property
+    def stats(self) -> ContentStats:
+        return self.indexes['stats']
+
+
 class ContentDatabase:
-    """内容数据库管理器"""
+    """
+    内容数据库管理器
+    
+    浏览带来的热度不写回内容文件：浏览次数累计在内存中，每隔 popularity_flush_interval 秒
+    合并为一次写时复制更新目录和索引，并保存到单独的浏览计数文件；
+    内容项的热度为内容文件中的值加上浏览次数。
+    """
     
-    def __init__(self, data_file: str = "data/content_db.json"):
+    def __init__(self, data_file: str = "data/content_db.json", background: bool = False,
+                 watch_interval: float = 0, popularity_file: Optional[str] = None,
+                 popularity_flush_interval: float = 0):
         self.data_file = data_file
-        self.content_items: Dict[str, ContentItem] = {}
-        self._load_content()
+        self.popularity_file = popularity_file
+        self.popularity_flush_interval = popularity_flush_interval
+        self._views: Dict[str, int] = self._load_views()  # 已合并到目录的浏览次数
+        self._pending_views: Counter = Counter()  # 尚未合并的浏览次数
+        self._views_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        # 随目录一起构建的索引：builder(items) -> 索引对象，
+        # 索引对象需实现 add(item)、update_popularity(content_id, popularity)
+        # 和 copy()（返回可独立修改的副本，用于写时复制）
+        self._index_builders: Dict[str, Callable[[LazyContentMap], Any]] = {
+            # 统计只计入有效内容项，直接读取原始记录，不构建模型
+            'stats': lambda items: ContentStats.build(items.valid_records()),
+            'suggest': lambda items: ContentSuggestIndex.build(items.valid_records())
+        }
+        self._snapshot = self._build_snapshot(LazyContentMap())
+        self.version = 0  # 目录每次变化（添加、重新加载）时递增
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._pending_writes: Optional[List[Tuple[str, Any]]] = None  # 重新加载期间的写操作，替换前重放
+        self._loaded = threading.Event()
+        self._can_save = True  # 已有的内容文件未能加载时为False，不写入以免覆盖原文件
+        # 记录已读取或写入的文件版本；watch_interval > 0 时还在后台轮询，变化后自动重新加载
+        self.watch_interval = watch_interval
+        self._watcher = FileWatcher(self.data_file, self.reload, watch_interval, name="content-watcher")
+        if background:
+            # 后台加载：加载完成前对外暴露空目录，完成后一次性发布
+            threading.Thread(target=self._load_content, name="content-loader", daemon=True).start()
+        else:
+            self._load_content()
+    
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """当前目录快照"""
+        return self._snapshot
+    
+    @property
+    def content_items(self) -> LazyContentMap:
+        return self._snapshot.items
+    
+    @property
+    def stats(self) -> ContentStats:
+        return self._snapshot.stats
+    
+    @property
+    def cache_version(self) -> Tuple[int, int]:
+        """用于推荐缓存失效的版本：目录版本 + 热门榜成员变化次数"""
+        snapshot = self._snapshot
+        return self.version, snapshot.stats.top_epoch
+    
+    @property
+    def is_loaded(self) -> bool:
+        """内容是否已加载完成"""
+        return self._loaded.is_set()
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """等待内容加载完成"""
+        return self._loaded.wait(timeout)
+    
+    def register_index(self, name: str, builder: Callable[[LazyContentMap], Any]):
+        """注册随目录构建和更新的索引，并立即为当前目录构建"""
+        with self._lock:
+            self._index_builders[name] = builder
+            snapshot = self._snapshot
+            self._snapshot = CatalogSnapshot(snapshot.items, {**snapshot.indexes, name: builder(snapshot.items)})
+    
+    def _read_catalog(self) -> LazyContentMap:
+        """流式解析内容文件，只保存原始记录（延迟校验）"""
+        items = LazyContentMap()
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            for item_data in iter_json_array(f):
+                if not isinstance(item_data, dict) or 'id' not in item_data:
+                    logger.warning(f"跳过无效内容记录: {str(item_data)[:100]}")
+                    continue
+                item_data['id'] = str(item_data['id'])
+                items.set_raw(item_data['id'], item_data)
+        self._overlay_views(items)
+        return items
+    
+    def _overlay_views(self, items: LazyContentMap):
+        """把已合并的浏览次数叠加到新读取内容的热度上"""
+        for content_id, views in list(self._views.items()):
+            items.add_popularity(content_id, views)
+    
+    def _build_snapshot(self, items: LazyContentMap) -> CatalogSnapshot:
+        """为内容项构建全部索引"""
+        indexes = {name: builder(items) for name, builder in list(self._index_builders.items())}
+        return CatalogSnapshot(items, indexes)
+    
+    def _publish(self, snapshot: CatalogSnapshot):
+        """发布新快照：补建缺失的索引，重放期间的写操作，然后原子替换引用"""
+        with self._lock:
+            for name, builder in self._index_builders.items():
+                if name not in snapshot.indexes:
+                    snapshot.indexes[name] = builder(snapshot.items)
+            
+            pending = self._pending_writes or []
+            self._pending_writes = None
+            for op, payload in pending:
+                if op == 'add':
+                    snapshot = self._apply_add(snapshot, payload)
+            
+            self._snapshot = snapshot
+            self.version += 1
+            if pending:
+                self._save_content()
     
     def _load_content(self):
-        """加载内容数据"""
+        """加载内容数据（流式解析，延迟校验）"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    for item_data in data:
-                        # 处理datetime字符串
-                        if 'created_at' in item_data and isinstance(item_data['created_at'], str):
-                            try:
-                                item_data['created_at'] = datetime.fromisoformat(item_data['created_at'])
-                            except:
-                                item_data['created_at'] = datetime.now()
-                    
-                        item = ContentItem(**item_data)
-                        self.content_items[item.id] = item
+                self._publish(self._build_snapshot(self._read_catalog()))
                 logger.info(f"已加载 {len(self.content_items)} 个内容项")
             else:
                 # 初始化示例数据
@@ -42,8 +389,50 @@ class ContentDatabase:
             logger.info("重新初始化内容数据库...")
             self._initialize_sample_content()
         except Exception as e:
-            logger.error(f"加载内容数据库失败: {e}")
-            self._initialize_sample_content()
+            # 构建索引等失败不代表文件损坏：保持空目录且不写入，文件修复后可重新加载
+            logger.error(f"加载内容数据库失败，内容文件保持不变: {e}")
+            self._can_save = False
+        finally:
+            self._loaded.set()
+            self._watcher.mark_seen()
+            if self.watch_interval > 0:
+                self._watcher.start()
+    
+    def reload(self) -> bool:
+        """
+        从文件重新加载内容目录（写时复制）
+        
+        新目录和索引在调用线程中构建，期间读请求继续使用旧快照、不被阻塞；
+        构建完成后一次性替换快照引用。加载失败时保留当前版本。
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            logger.info("内容目录正在重新加载，跳过本次请求")
+            return False
+        try:
+            self.wait_until_loaded()
+            with self._lock:
+                self._pending_writes = []
+            # 读取前记录文件版本，读取期间的修改会再次触发重新加载
+            self._watcher.mark_seen()
+            try:
+                snapshot = self._build_snapshot(self._read_catalog())
+            except Exception as e:
+                logger.error(f"重新加载内容目录失败，继续使用当前版本: {e}")
+                with self._lock:
+                    self._pending_writes = None
+                return False
+            self._can_save = True
+            self._publish(snapshot)
+            logger.info(f"内容目录已重新加载: {len(snapshot.items)} 个内容项, 版本 {self.version}")
+            return True
+        finally:
+            self._reload_lock.release()
+    
+    def _reload_if_changed(self):
+        """文件在上次读取或保存后被外部修改时先重新加载，写入时不覆盖外部编辑"""
+        if self._watcher.changed():
+            logger.info("内容文件已被外部修改，写入前重新加载")
+            self.reload()
     
     def _initialize_sample_content(self):
         """初始化示例内容"""
@@ -140,21 +529,37 @@ class ContentDatabase:
             }
         ]
         
+        items = LazyContentMap()
         for item_data in sample_content:
             item = ContentItem(**item_data)
-            self.content_items[item.id] = item
+            items[item.id] = item
+        self._overlay_views(items)
+        self._publish(self._build_snapshot(items))
         
         # 保存到文件
         self._save_content()
     
     def _save_content(self):
         """保存内容到文件"""
+        if not self._can_save:
+            logger.error(f"内容文件未能加载，跳过保存以免覆盖: {self.data_file}")
+            return
         try:
             os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            content_list = [item.dict() for item in self.content_items.values()]
+            items = self.content_items
+            content_list = []
+            for record in items.raw_records():
+                data = record.dict() if isinstance(record, ContentItem) else record
+                content_id = record_field(record, 'id')
+                views = self._views.get(content_id)
+                if views and content_id in items:
+                    # 文件中只保存不含浏览次数的热度
+                    data = {**data, 'popularity': data.get('popularity', 0) - views}
+                content_list.append(data)
         
-            # 使用自定义的JSON编码器处理datetime
-            with open(self.data_file, 'w', encoding='utf-8') as f:
+            # 使用自定义的JSON编码器处理datetime；先写临时文件再替换，避免留下半写的文件
+            tmp_file = f"{self.data_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
                 json.dump(
                     content_list, 
                     f, 
@@ -162,6 +567,8 @@ class ContentDatabase:
                     indent=2,
                     default=self._json_serializer
                 )
+            os.replace(tmp_file, self.data_file)
+            self._watcher.mark_seen()
             logger.info(f"内容数据库已保存: {self.data_file}")
         except Exception as e:
             logger.error(f"保存内容数据库失败: {e}")
@@ -173,6 +580,9 @@ class ContentDatabase:
         elif hasattr(obj, 'dict'):
             return obj.dict()
         
+    def to_json_line(self, item: ContentItem) -> str:
+        """将内容项序列化为一行JSON（NDJSON导出用）"""
+        return json.dumps(item.dict(), ensure_ascii=False, default=self._json_serializer)
     
     def get_all_content(self) -> List[ContentItem]:
         """获取所有内容"""
@@ -182,40 +592,283 @@ class ContentDatabase:
         """根据ID获取内容"""
         return self.content_items.get(content_id)
     
+    def iter_content(self, content_type: Optional[str] = None,
+                     category: Optional[str] = None) -> Iterator[ContentItem]:
+        """按目录顺序流式遍历内容，不构建完整列表"""
+        for _, item in self.content_items.iter_from(0):
+            if content_type and item.type != content_type:
+                continue
+            if category and item.category != category:
+                continue
+            yield item
+    
+    def list_content(self, cursor: Optional[str] = None, limit: int = 20,
+                     content_type: Optional[str] = None,
+                     category: Optional[str] = None) -> Tuple[List[ContentItem], Optional[str]]:
+        """
+        游标分页浏览内容目录
+        
+        返回: (当前页内容, 下一页游标；没有更多时为None)
+        """
+        items = self.content_items
+        start = 0
+        if cursor:
+            after_id = decode_cursor(cursor).get('after')
+            if not isinstance(after_id, str):
+                raise ValueError("无效的分页游标")
+            position = items.position_of(after_id)
+            if position is None:
+                raise ValueError("游标已失效")
+            start = position + 1
+        
+        page = []
+        for position, item in items.iter_from(start):
+            if content_type and item.type != content_type:
+                continue
+            if category and item.category != category:
+                continue
+            if len(page) == limit:
+                return page, encode_cursor({'after': page[-1].id})
+            page.append(item)
+        return page, None
+    
     def search_content(self, query: str, limit: int = 10) -> List[ContentItem]:
         """搜索内容"""
+        results, _ = self.search_content_page(query, limit)
+        return results
+    
+    def search_content_page(self, query: str, limit: int = 10,
+                            cursor: Optional[str] = None) -> Tuple[List[ContentItem], Optional[str]]:
+        """
+        分页搜索内容，结果按 (分数降序, 目录顺序) 排列
+        
+        返回: (当前页结果, 下一页游标；没有更多时为None)
+        """
         query_lower = query.lower()
-        results = []
+        after = None
+        if cursor:
+            data = decode_cursor(cursor)
+            try:
+                after = (-int(data['s']), int(data['p']))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("无效的分页游标")
         
-        for item in self.content_items.values():
-            # 计算匹配分数
-            score = 0
-            if query_lower in item.title.lower():
-                score += 3
-            if query_lower in item.description.lower():
-                score += 2
-            for tag in item.tags:
-                if query_lower in tag.lower():
-                    score += 1
-            
-            if score > 0:
-                results.append((score, item))
+        items = self.content_items
+        
+        def scored():
+            for position, item in items.iter_from(0):
+                # 计算匹配分数
+                score = 0
+                if query_lower in item.title.lower():
+                    score += 3
+                if query_lower in item.description.lower():
+                    score += 2
+                for tag in item.tags:
+                    if query_lower in tag.lower():
+                        score += 1
+                
+                if score > 0 and (after is None or (-score, position) > after):
+                    yield -score, position, item
         
-        # 按分数排序
-        results.sort(key=lambda x: x[0], reverse=True)
-        return [item for _, item in results[:limit]]
+        # 只保留前 limit+1 条，多取一条用于判断是否还有下一页
+        top = heapq.nsmallest(limit + 1, scored(), key=lambda x: (x[0], x[1]))
+        page = top[:limit]
+        next_cursor = None
+        if len(top) > limit and page:
+            neg_score, position, _ = page[-1]
+            next_cursor = encode_cursor({'s': -neg_score, 'p': position})
+        return [item for _, _, item in page], next_cursor
     
     def increment_popularity(self, content_id: str):
-        """增加内容热度"""
-        if content_id in self.content_items:
-            self.content_items[content_id].popularity += 1
-            self._save_content()
+        """记录一次浏览，热度在下次合并时更新"""
+        self._queue_views({content_id: 1})
+    
+    def _queue_views(self, counts: Dict[str, int], delay: Optional[float] = None):
+        """累计浏览次数，并在 delay 秒后合并（默认 popularity_flush_interval，0表示立即合并）"""
+        delay = self.popularity_flush_interval if delay is None else delay
+        with self._views_lock:
+            self._pending_views.update(counts)
+            if self._flush_timer is not None:
+                return
+            if delay > 0:
+                self._flush_timer = threading.Timer(delay, self.flush_popularity)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+                return
+        self.flush_popularity()
+    
+    def flush_popularity(self):
+        """把累计的浏览次数合并为一次写时复制更新，并保存浏览计数文件"""
+        self.wait_until_loaded()
+        with self._views_lock:
+            pending, self._pending_views = self._pending_views, Counter()
+            self._flush_timer = None
+        if not pending:
+            return
+        with self._lock:
+            reloading = self._pending_writes is not None
+            if not reloading:
+                counts = {cid: count for cid, count in pending.items() if cid in self._snapshot.items}
+                if counts:
+                    self._snapshot = self._apply_popularity(self._snapshot, counts)
+                    for content_id, count in counts.items():
+                        self._views[content_id] = self._views.get(content_id, 0) + count
+                    self._save_views()
+        if reloading:
+            # 新目录按读取时的浏览次数叠加热度，本批留到新快照发布后再合并
+            self._queue_views(pending, max(self.popularity_flush_interval, 1.0))
     
     def add_content(self, content_item: ContentItem):
         """添加新内容"""
-        self.content_items[content_item.id] = content_item
-        self._save_content()
+        self.wait_until_loaded()
+        self._reload_if_changed()
+        with self._lock:
+            self._snapshot = self._apply_add(self._snapshot, [content_item])
+            self._record_write('add', [content_item])
+            self._discard_views([content_item.id])
+            self.version += 1
+            self._save_content()
         logger.info(f"已添加内容: {content_item.title}")
+    
+    def _apply_add(self, snapshot: CatalogSnapshot, items: List[ContentItem]) -> CatalogSnapshot:
+        """在快照的副本上写入内容并增量更新全部索引，返回新快照"""
+        new_items = snapshot.items.copy()
+        for item in items:
+            new_items[item.id] = item
+        indexes = {}
+        for name, index in snapshot.indexes.items():
+            index = index.copy()
+            add_many = getattr(index, 'add_many', None)
+            if add_many:
+                add_many(items)
+            else:
+                for item in items:
+                    index.add(item)
+            indexes[name] = index
+        return CatalogSnapshot(new_items, indexes)
+    
+    def _apply_popularity(self, snapshot: CatalogSnapshot, counts: Dict[str, int]) -> CatalogSnapshot:
+        """在快照的副本上批量增加内容热度并通知索引，返回新快照（counts 中的内容须存在）"""
+        new_items = snapshot.items.copy()
+        for content_id, count in counts.items():
+            item = new_items[content_id]
+            new_items[content_id] = item.copy(update={'popularity': item.popularity + count})
+        indexes = {}
+        for name, index in snapshot.indexes.items():
+            index = index.copy()
+            for content_id in counts:
+                index.update_popularity(content_id, new_items[content_id].popularity)
+            indexes[name] = index
+        return CatalogSnapshot(new_items, indexes)
+    
+    def _load_views(self) -> Dict[str, int]:
+        """读取浏览计数文件"""
+        if not self.popularity_file or not os.path.exists(self.popularity_file):
+            return {}
+        try:
+            with open(self.popularity_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {str(k): v for k, v in data.items() if type(v) is int and v > 0}
+        except Exception as e:
+            logger.error(f"读取浏览计数失败，从零开始计数: {e}")
+            return {}
+    
+    def _save_views(self):
+        """保存浏览计数文件（先写临时文件再替换）"""
+        if not self.popularity_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.popularity_file) or '.', exist_ok=True)
+            tmp_file = f"{self.popularity_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._views, f, ensure_ascii=False)
+            os.replace(tmp_file, self.popularity_file)
+        except Exception as e:
+            logger.error(f"保存浏览计数失败: {e}")
+    
+    def _discard_views(self, content_ids: List[str]):
+        """内容被覆盖时以新内容的热度为准，清除其已合并的浏览次数"""
+        removed = [content_id for content_id in content_ids if self._views.pop(content_id, None) is not None]
+        if removed:
+            self._save_views()
+    
+    def _record_write(self, op: str, payload: Any):
+        """重新加载进行中时记录写操作，以便重放到新快照"""
+        if self._pending_writes is not None:
+            self._pending_writes.append((op, payload))
+    
+    def bulk_import(self, rows: Iterable[Tuple[int, Any]], atomic: bool = False,
+                    dry_run: bool = False, batch_size: int = 500) -> Dict[str, Any]:
+        """
+        批量导入内容
+        
+        rows 为 (行号, 原始记录) 序列。按批校验并收集逐行错误，
+        所有有效内容一次性写入目录和索引，并只保存一次文件。
+        atomic=True 时只要有一行失败就不导入任何内容；dry_run=True 时只校验不导入。
+        """
+        valid: List[ContentItem] = []
+        errors: List[Dict[str, Any]] = []
+        
+        batch: List[Tuple[int, Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._validate_batch(batch, valid, errors)
+                batch = []
+        if batch:
+            self._validate_batch(batch, valid, errors)
+        
+        imported = 0
+        if valid and not dry_run and not (atomic and errors):
+            self.wait_until_loaded()
+            self._reload_if_changed()
+            with self._lock:
+                self._snapshot = self._apply_add(self._snapshot, valid)
+                self._record_write('add', valid)
+                self._discard_views([item.id for item in valid])
+                self.version += 1
+                self._save_content()
+            imported = len(valid)
+            logger.info(f"批量导入内容: 成功 {imported} 条, 失败 {len(errors)} 条")
+        
+        return {
+            "imported": imported,
+            "failed": len(errors),
+            "errors": errors
+        }
+    
+    def _validate_batch(self, batch: List[Tuple[int, Any]], valid: List[ContentItem],
+                        errors: List[Dict[str, Any]]):
+        """校验一批记录"""
+        for row, record in batch:
+            if not isinstance(record, dict):
+                errors.append({"row": row, "id": None, "error": "记录必须是JSON对象"})
+                continue
+            try:
+                valid.append(_build_item(record))
+            except ValidationError as e:
+                errors.append({
+                    "row": row,
+                    "id": record.get('id'),
+                    "error": "; ".join(
+                        f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+                    )
+                })
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """标题和标签的前缀联想（按热度降序）"""
+        return self._snapshot.indexes['suggest'].suggest(prefix, limit)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取内容统计信息（物化视图，O(K)）"""
+        with self._lock:
+            return self.stats.snapshot()
 
 # 全局内容数据库实例
-content_db = ContentDatabase()
\ No newline at end of file
+content_db = ContentDatabase(
+    config.CONTENT_DB_FILE,
+    background=config.CONTENT_BACKGROUND_LOAD,
+    watch_interval=config.CONTENT_WATCH_INTERVAL,
+    popularity_file=config.CONTENT_POPULARITY_FILE,
+    popularity_flush_interval=config.CONTENT_POPULARITY_FLUSH_INTERVAL
+)
\ No newline at end of file
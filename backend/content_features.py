@@ -0,0 +1,362 @@
+import copy
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils import GrowableArray, record_field, record_strings, record_text
+
+
+class ContentFeatureIndex:
+    """
+    规则推荐的特征矩阵（向量化打分）
+
+    把目录编译为按行对齐的特征：
+    - 情绪标签、标签的关联矩阵（按列存储的稀疏形式：标签 -> 行号数组）
+    - 难度编码数组、分类编码数组、热度向量
+    - 标题+标签的小写文本，配合字符倒排表快速定位包含关键词的行
+    打分只需若干次向量运算，再用 partition 取 top-k，权重与逐项打分完全一致；
+    与热度无关的部分（情绪得分、关键词命中行、关切点和难度掩码）按查询条件缓存。
+    覆盖已有内容时原地更新所在行，行号始终与目录顺序一致。
+
+    候选表：情绪和对话阶段的打分规则是固定的，对每个 (情绪, 难度) 预先算好只含
+    情绪、难度和热度三项的前N行，目录变化时重建。查询时只需对
+    "候选表 ∪ 关键词命中行 ∪ 关切点命中行 ∪ 热度变化过的行" 打分，结果与全量打分一致
+    （不在其中的行得分不变，且排在候选表的每一行之后；热度只增不减）。
+    """
+
+    # 增量修改的行超过该比例时重建字符倒排表
+    CHAR_INDEX_REBUILD_RATIO = 0.1
+    QUERY_CACHE_SIZE = 512
+    # 热度变化过的行超过该数量时重建候选表
+    TABLE_REFRESH_CHANGES = 1000
+    # 候选行超过全部内容的该比例时改为全量打分
+    TABLE_MAX_CANDIDATE_RATIO = 0.05
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._popularity = GrowableArray(np.float64)
+        self._difficulty = GrowableArray(np.int32)
+        self._category = GrowableArray(np.int32)
+        self._difficulty_vocab: Dict[str, int] = {}
+        self._category_vocab: Dict[str, int] = {}
+        # 关联矩阵的列：标签 -> 行号列表（情绪标签保留重复出现）
+        self._emotion_columns: Dict[str, List[int]] = {}
+        self._tag_columns: Dict[str, List[int]] = {}
+        self._row_emotions: List[List[str]] = []
+        self._row_tags: List[List[str]] = []
+        self._column_cache: Dict[tuple, np.ndarray] = {}
+        # 字符倒排表（首次按关键词查询时构建），以及之后改动过的行
+        self._char_index: Optional[Dict[str, np.ndarray]] = None
+        self._dirty_rows: set = set()
+        self._query_cache: Dict[tuple, np.ndarray] = {}
+        # 候选表：((情绪, 难度) -> 行号数组（升序）, 建表后热度变化过的行（升序数组）)
+        # 两者作为一个元组整体替换，读取方一次取到一致的一对，不会读到修改中的集合
+        self._table_spec: Optional[tuple] = None
+        self._table_state: Tuple[Dict[tuple, np.ndarray], np.ndarray] = ({}, np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def build(cls, records: Iterable[Any]) -> "ContentFeatureIndex":
+        """从内容记录全量构建"""
+        index = cls()
+        index.add_many(records)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def copy(self) -> "ContentFeatureIndex":
+        """可独立修改的副本（写时复制用）；字符倒排表和候选表只会整体替换，直接共享"""
+        clone = copy.copy(self)
+        clone.ids = list(self.ids)
+        clone._row_of = dict(self._row_of)
+        clone._texts = list(self._texts)
+        clone._popularity = self._popularity.copy()
+        clone._difficulty = self._difficulty.copy()
+        clone._category = self._category.copy()
+        clone._difficulty_vocab = dict(self._difficulty_vocab)
+        clone._category_vocab = dict(self._category_vocab)
+        clone._emotion_columns = {key: list(rows) for key, rows in self._emotion_columns.items()}
+        clone._tag_columns = {key: list(rows) for key, rows in self._tag_columns.items()}
+        clone._row_emotions = list(self._row_emotions)
+        clone._row_tags = list(self._row_tags)
+        clone._column_cache = dict(self._column_cache)
+        clone._dirty_rows = set(self._dirty_rows)
+        clone._query_cache = dict(self._query_cache)
+        return clone
+
+    def add(self, item: Any):
+        self.add_many([item])
+
+    def add_many(self, items: Iterable[Any]):
+        """添加或覆盖内容"""
+        popularity, difficulty, category = [], [], []
+        for record in items:
+            content_id = record_field(record, 'id')
+            row = self._row_of.get(content_id)
+            # 类型不符的字段按空值处理，个别记录不会中断整个构建
+            emotion_tags = record_strings(record, 'emotion_tags')
+            tags = record_strings(record, 'tags')
+            text = record_text(record, 'title').lower() + '\n' + ' '.join(tags).lower()
+            item_difficulty = record_field(record, 'difficulty')
+            if not isinstance(item_difficulty, str):
+                item_difficulty = None
+            difficulty_code = self._code(self._difficulty_vocab, item_difficulty)
+            category_code = self._code(self._category_vocab, record_text(record, 'category'))
+            item_popularity = record_field(record, 'popularity', 0)
+            if not isinstance(item_popularity, (int, float)):
+                item_popularity = 0
+
+            if row is None:
+                row = len(self.ids)
+                self.ids.append(content_id)
+                self._row_of[content_id] = row
+                self._texts.append(text)
+                self._row_emotions.append(emotion_tags)
+                self._row_tags.append(tags)
+                popularity.append(item_popularity)
+                difficulty.append(difficulty_code)
+                category.append(category_code)
+            else:
+                # 覆盖：先从旧标签列中移除该行
+                self._remove_from_columns(self._emotion_columns, self._row_emotions[row], row, 'emotion')
+                self._remove_from_columns(self._tag_columns, self._row_tags[row], row, 'tag')
+                self._texts[row] = text
+                self._row_emotions[row] = emotion_tags
+                self._row_tags[row] = tags
+                self._flush_rows(popularity, difficulty, category)
+                popularity, difficulty, category = [], [], []
+                self._popularity.view[row] = item_popularity
+                self._difficulty.view[row] = difficulty_code
+                self._category.view[row] = category_code
+
+            self._add_to_columns(self._emotion_columns, emotion_tags, row, 'emotion')
+            self._add_to_columns(self._tag_columns, tags, row, 'tag')
+            if self._char_index is not None:
+                self._dirty_rows.add(row)
+
+        self._flush_rows(popularity, difficulty, category)
+        self._query_cache = {}
+        if self._char_index is not None and len(self._dirty_rows) > self.CHAR_INDEX_REBUILD_RATIO * len(self.ids):
+            self._char_index = None
+        if self._table_spec is not None:
+            self._build_tables()
+
+    def update_popularity(self, content_id: str, popularity: int):
+        row = self._row_of.get(content_id)
+        if row is not None:
+            self._popularity.view[row] = popularity
+            if self._table_spec is not None:
+                tables, changed = self._table_state
+                changed = np.union1d(changed, [row]).astype(np.int64)
+                if changed.size > self.TABLE_REFRESH_CHANGES:
+                    self._build_tables()
+                else:
+                    self._table_state = (tables, changed)
+
+    def materialize_tables(self,
+                           emotions: Sequence[str],
+                           depths: Sequence[Union[str, List[str]]],
+                           emotion_weights: Dict[str, List[str]],
+                           size: int):
+        """为每个 (情绪, 难度) 预先计算候选表，之后目录变化时自动重建"""
+        levels = list(dict.fromkeys(self._levels(depth) for depth in depths))
+        self._table_spec = (list(emotions), levels, emotion_weights, size)
+        self._build_tables()
+
+    def rank(self,
+             current_emotion: str,
+             keywords: Sequence[str],
+             key_concerns: Sequence[str],
+             depth: Union[str, List[str]],
+             emotion_weights: Dict[str, List[str]],
+             limit: int) -> List[str]:
+        """按规则打分取前limit项的ID；命中候选表时只对候选行打分"""
+        rows = self._table_candidates(current_emotion, keywords, key_concerns, depth, emotion_weights, limit)
+        scores = self.score(current_emotion, keywords, key_concerns, depth, emotion_weights, rows)
+        return self.top_ids(scores, limit, rows)
+
+    def score(self,
+              current_emotion: str,
+              keywords: Sequence[str],
+              key_concerns: Sequence[str],
+              depth: Union[str, List[str]],
+              emotion_weights: Dict[str, List[str]],
+              rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """对全部内容（或指定的升序行号）向量化打分，权重与逐项规则打分一致"""
+        select = slice(None) if rows is None else rows
+
+        # 1. 情绪匹配（权重最高），只与当前情绪有关，按情绪缓存
+        related = tuple(tag for tag, categories in emotion_weights.items() if current_emotion in categories)
+        scores = self._cached(('emotion', current_emotion, related),
+                              lambda: self._emotion_scores(current_emotion, related))[select].copy()
+
+        # 2. 关键词匹配（标题或标签包含关键词）
+        for keyword in keywords:
+            hits = self._keyword_rows(keyword)
+            scores[hits if rows is None else np.isin(rows, hits)] += 2.0
+
+        # 3. 关切点匹配（标签完全一致或分类包含关切点）
+        for concern in key_concerns:
+            scores += self._cached(('concern', concern), lambda: self._concern_mask(concern) * 1.5)[select]
+
+        # 4. 对话阶段匹配（难度适配）
+        levels = self._levels(depth)
+        scores += self._cached(('depth', levels),
+                               lambda: self._code_mask(self._difficulty, self._difficulty_vocab, levels) * 1.0)[select]
+
+        # 5. 热度加权
+        scores += self._popularity.view[select] * 0.01
+        return scores
+
+    def top_ids(self, scores: np.ndarray, limit: int, rows: Optional[np.ndarray] = None) -> List[str]:
+        """取分数大于0的前limit项，同分按目录顺序；rows 为 scores 对应的行号"""
+        top = self._top_positions(scores, limit)
+        if rows is not None:
+            top = rows[top]
+        return [self.ids[row] for row in top]
+
+    @staticmethod
+    def _top_positions(scores: np.ndarray, limit: int) -> np.ndarray:
+        positions = np.flatnonzero(scores > 0)
+        if positions.size > limit > 0:
+            values = scores[positions]
+            kth = np.partition(values, positions.size - limit)[positions.size - limit]
+            positions = positions[values >= kth]
+        order = np.lexsort((positions, -scores[positions]))
+        return positions[order][:limit]
+
+    def _table_candidates(self,
+                          current_emotion: str,
+                          keywords: Sequence[str],
+                          key_concerns: Sequence[str],
+                          depth: Union[str, List[str]],
+                          emotion_weights: Dict[str, List[str]],
+                          limit: int) -> Optional[np.ndarray]:
+        """候选表与关键词、关切点、热度变化行的并集；无可用候选表时返回 None（全量打分）"""
+        spec = self._table_spec
+        # 检测配置每次加载都会生成新的映射对象，按内容比较（同一对象时直接通过）
+        if spec is None or limit > spec[3] or (emotion_weights is not spec[2] and emotion_weights != spec[2]):
+            return None
+        tables, changed = self._table_state
+        table = tables.get((current_emotion, self._levels(depth)))
+        if table is None:
+            return None
+
+        parts = [table, changed]
+        parts.extend(self._keyword_rows(keyword) for keyword in keywords)
+        parts.extend(self._cached(('concern_rows', concern), lambda: np.flatnonzero(self._concern_mask(concern)))
+                     for concern in key_concerns)
+        # 关键词或关切点命中大量内容时，全量打分更快
+        if sum(part.size for part in parts) > len(self.ids) * self.TABLE_MAX_CANDIDATE_RATIO:
+            return None
+        return np.unique(np.concatenate(parts))
+
+    def _build_tables(self):
+        emotions, levels_list, emotion_weights, size = self._table_spec
+        tables = {}
+        for emotion in emotions:
+            for levels in levels_list:
+                scores = self.score(emotion, [], [], list(levels), emotion_weights)
+                tables[(emotion, levels)] = np.sort(self._top_positions(scores, size))
+        self._table_state = (tables, np.zeros(0, dtype=np.int64))
+
+    def _emotion_scores(self, current_emotion: str, related: Sequence[str]) -> np.ndarray:
+        """情绪部分的得分：含当前情绪 +3，每个相关情绪标签 +2（重复出现的标签重复计分）"""
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float64)
+        scores[self._column(self._emotion_columns, current_emotion, 'emotion_unique')] += 3.0
+        for emotion_tag in related:
+            scores += np.bincount(self._column(self._emotion_columns, emotion_tag, 'emotion'), minlength=n) * 2.0
+        return scores
+
+    def _concern_mask(self, concern: str) -> np.ndarray:
+        mask = self._code_mask(self._category, self._category_vocab,
+                               [category for category in self._category_vocab if concern in category])
+        mask[self._column(self._tag_columns, concern, 'tag')] = True
+        return mask
+
+    def _keyword_rows(self, keyword: str) -> np.ndarray:
+        """标题或标签中包含关键词的行"""
+        return self._cached(('keyword', keyword), lambda: self._match_keyword(keyword))
+
+    def _match_keyword(self, keyword: str) -> np.ndarray:
+        if not keyword:
+            return np.arange(len(self.ids))
+        if self._char_index is None:
+            self._build_char_index()
+
+        # 用关键词中最稀有的字缩小候选范围，再逐行确认
+        empty = np.zeros(0, dtype=np.int64)
+        candidates = min((self._char_index.get(char, empty) for char in set(keyword)), key=len)
+        texts = self._texts
+        rows = [row for row in candidates.tolist() if row not in self._dirty_rows and keyword in texts[row]]
+        rows.extend(row for row in self._dirty_rows if keyword in texts[row])
+        return np.asarray(rows, dtype=np.int64)
+
+    def _cached(self, key: tuple, compute) -> np.ndarray:
+        """查询结果缓存（与热度无关的部分），内容变化时清空"""
+        cached = self._query_cache.get(key)
+        if cached is None:
+            if len(self._query_cache) >= self.QUERY_CACHE_SIZE:
+                self._query_cache.pop(next(iter(self._query_cache)))
+            cached = self._query_cache[key] = compute()
+        return cached
+
+    @staticmethod
+    def _levels(depth: Union[str, List[str]]) -> tuple:
+        return tuple(depth) if isinstance(depth, list) else (depth,)
+
+    @staticmethod
+    def _code_mask(codes: GrowableArray, vocab: Dict[str, int], values: List[str]) -> np.ndarray:
+        """编码数组中取值属于 values 的行（查表实现，编码-1表示空值）"""
+        table = np.zeros(len(vocab) + 1, dtype=bool)
+        for value in values:
+            if value in vocab:
+                table[vocab[value]] = True
+        return table[codes.view]
+
+    def _build_char_index(self):
+        postings: Dict[str, List[int]] = {}
+        for row, text in enumerate(self._texts):
+            for char in set(text):
+                postings.setdefault(char, []).append(row)
+        self._char_index = {char: np.asarray(rows, dtype=np.int64) for char, rows in postings.items()}
+        self._dirty_rows = set()
+
+    def _column(self, columns: Dict[str, List[int]], key: str, kind: str) -> np.ndarray:
+        """关联矩阵的一列（行号数组，带缓存）；kind 以 _unique 结尾时去重"""
+        cache_key = (kind, key)
+        cached = self._column_cache.get(cache_key)
+        if cached is None:
+            cached = np.asarray(columns.get(key, []), dtype=np.int64)
+            if kind.endswith('_unique'):
+                cached = np.unique(cached)
+            self._column_cache[cache_key] = cached
+        return cached
+
+    def _add_to_columns(self, columns: Dict[str, List[int]], keys: List[str], row: int, kind: str):
+        for key in keys:
+            columns.setdefault(key, []).append(row)
+            self._column_cache.pop((kind, key), None)
+            self._column_cache.pop((kind + '_unique', key), None)
+
+    def _remove_from_columns(self, columns: Dict[str, List[int]], keys: List[str], row: int, kind: str):
+        for key in keys:
+            columns[key].remove(row)
+            self._column_cache.pop((kind, key), None)
+            self._column_cache.pop((kind + '_unique', key), None)
+
+    def _flush_rows(self, popularity: List[int], difficulty: List[int], category: List[int]):
+        self._popularity.extend(popularity)
+        self._difficulty.extend(difficulty)
+        self._category.extend(category)
+
+    @staticmethod
+    def _code(vocab: Dict[str, int], value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        if value not in vocab:
+            vocab[value] = len(vocab)
+        return vocab[value]
@@ -1,12 +1,21 @@
+import json
 import logging
-from typing import List, Dict, Any, Tuple
-import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Hashable, Optional, Tuple, Union
+from itertools import zip_longest
 from datetime import datetime
 from openai import OpenAI
 from config import config
+from detection_config import detection_config, DetectionRules
+from text_analysis import AnalyzedText
+from llm_scheduler import llm_scheduler, BACKGROUND
 from models import ContentItem
 from conversation_manager import ConversationManager
-from content_db import content_db
+from content_db import content_db, CatalogSnapshot
+from content_vectors import ContentVectorIndex
+from content_features import ContentFeatureIndex
+from recommendation_cache import RecommendationCache
 
 logger = logging.getLogger(__name__)
 
@@ -20,21 +29,7 @@ class ContentRecommender:
         )
         self.model = config.CHAT_MODEL
         
-        # 情绪到内容的映射权重
-        self.emotion_weights = {
-            "学业压力": ["academic", "stress_management"],
-            "焦虑": ["relaxation", "mindfulness", "anxiety"],
-            "抑郁": ["self_reflection", "mood_management"],
-            "愤怒": ["anger_management", "emotional_regulation"],
-            "压力": ["stress_management", "relaxation"],
-            "人际矛盾": ["relationship", "communication"],
-            "困惑": ["self_reflection", "decision_making"],
-            "不确定": ["future", "decision_making"],
-            "未来迷茫": ["future", "career_planning"],
-            "自我怀疑": ["self_esteem", "self_reflection"],
-            "孤独": ["relationship", "social_skills"],
-            "失眠": ["sleep", "relaxation"]
-        }
+        # 情绪到内容的映射权重来自可热加载的检测配置（见 emotion_weights 属性）
         
         # 对话阶段到内容深度的映射
         self.stage_depth_mapping = {
@@ -43,194 +38,368 @@ class ContentRecommender:
             "deepening": "intermediate",
             "resolving": ["intermediate", "advanced"]
         }
+        
+        # 推荐结果缓存（按用户文本/情绪/阶段/关切点，随目录版本失效）
+        self.cache = RecommendationCache(config.RECOMMEND_CACHE_SIZE, config.RECOMMEND_CACHE_TTL)
+        
+        # 交给AI重排的候选数量
+        self.candidate_count = config.RECOMMEND_CANDIDATES
+        
+        # AI重排在线程池中执行，超过期限先返回规则推荐；相同缓存键的AI请求只发起一次
+        self.ai_deadline = config.RECOMMEND_AI_DEADLINE
+        self.ai_request_timeout = config.RECOMMEND_AI_REQUEST_TIMEOUT
+        self._ai_executor = ThreadPoolExecutor(
+            max_workers=config.RECOMMEND_AI_WORKERS, thread_name_prefix="recommend-ai"
+        )
+        self._pending: Dict[Hashable, Future] = {}
+        self._pending_lock = threading.Lock()
+        
+        # 向量索引和规则打分特征随内容目录构建，添加内容时增量更新
+        # 只索引有效内容项（读取原始记录，不构建模型）
+        content_db.register_index('vectors', lambda items: ContentVectorIndex.build(items.valid_records()))
+        content_db.register_index('features', self._build_features)
+        
+        # 情绪映射变化后重建候选表（重建完成前打分自动退回全量计算）
+        detection_config.subscribe(self._on_detection_rules_changed)
+    
+    @property
+    def emotion_weights(self) -> Dict[str, List[str]]:
+        """情绪到内容类别的映射（当前检测配置版本中的对象）"""
+        return detection_config.current.emotion_weights
+    
+    @property
+    def table_emotions(self) -> List[str]:
+        """预计算候选表覆盖的情绪：情绪分析可能给出的标签及情绪映射中的情绪"""
+        return list(dict.fromkeys([
+            "学业压力", "焦虑", "抑郁", "愤怒", "压力", "人际矛盾", "困惑", "不确定",
+            "中性", "快乐", "平静", "放松", "其他", *self.emotion_weights
+        ]))
+    
+    def _build_features(self, items) -> ContentFeatureIndex:
+        """为有效内容项构建规则打分特征，并物化每个 (情绪, 对话阶段) 的候选表"""
+        features = ContentFeatureIndex.build(items.valid_records())
+        features.materialize_tables(
+            self.table_emotions,
+            [*self.stage_depth_mapping.values(), 'beginner'],
+            self.emotion_weights,
+            max(config.RECOMMEND_TABLE_SIZE, self.candidate_count)
+        )
+        return features
+    
+    def _on_detection_rules_changed(self, old: DetectionRules, new: DetectionRules):
+        """检测配置切换后，情绪映射有变化时重建规则打分特征并清空推荐缓存"""
+        if old.emotion_weights == new.emotion_weights:
+            return
+        content_db.register_index('features', self._build_features)
+        self.cache.clear()
+        logger.info(f"情绪映射已更新（检测配置版本 {new.version}），候选表已重建")
     
     def recommend_content(self, 
-                         user_input: str,
+                         user_input: Union[str, AnalyzedText],
                          current_emotion: str,
                          conversation_summary: Dict[str, Any],
                          content_types: List[str] = None,
-                         limit: int = 3) -> Tuple[List[ContentItem], str, Dict[str, float]]:
+                         limit: int = 3) -> Tuple[List[ContentItem], str, Dict[str, float], str]:
         """
         推荐个性化内容
         
-        返回: (推荐内容列表, 推荐理由, 匹配度分数)
+        本地召回（规则+语义）完成后，AI重排在后台执行，最多等待 ai_deadline 秒；
+        超时则立即返回规则推荐，AI结果晚到后写入缓存供下次使用。
+        
+        返回: (推荐内容列表, 推荐理由, 匹配度分数, 推荐策略)
+        推荐策略: ai_rerank（AI重排）、rule_based（本地规则与语义召回）、default（兜底搜索）
+        user_input 可以是请求入口已创建的 AnalyzedText，关键词和检索特征不再重复计算。
         """
+        analysis = AnalyzedText.of(user_input)
+        user_input = analysis.text
+        cache_key = self.cache.make_key(user_input, current_emotion, conversation_summary, limit, content_types)
+        cache_version = content_db.cache_version
+        cached = self.cache.get(cache_key, cache_version)
+        if cached is not None:
+            return self._copy_result(cached)
+        
         try:
+            # 本次推荐全程使用同一个目录快照
+            snapshot = content_db.snapshot
+            
+            depth = max(limit, self.candidate_count)
+            
             # 策略1: 基于情绪和对话上下文的规则推荐
             rule_based_recs = self._rule_based_recommendation(
-                user_input, current_emotion, conversation_summary, limit
-            )
-            
-            # 策略2: 使用AI进行智能推荐
-            ai_based_recs = self._ai_based_recommendation(
-                user_input, current_emotion, conversation_summary, limit
+                analysis, current_emotion, conversation_summary, depth, snapshot
             )
             
-            # 合并推荐结果，去重
-            all_recs = {}
-            for rec in rule_based_recs + ai_based_recs:
-                if rec.id not in all_recs:
-                    all_recs[rec.id] = rec
+            # 策略2: 本地向量语义检索
+            semantic_recs = self._semantic_recommendation(analysis, depth, snapshot)
             
-            # 按相关度排序
-            recommended_items = list(all_recs.values())[:limit]
-            
-            # 生成推荐理由
-            rationale = self._generate_rationale(
-                recommended_items, user_input, current_emotion, conversation_summary
-            )
-            
-            # 计算匹配度分数
-            match_scores = self._calculate_match_scores(
-                recommended_items, user_input, current_emotion, conversation_summary
+            # 策略3: 从本地候选中由AI重排（后台执行，限时等待）
+            local_recs = self._dedupe(self._interleave(rule_based_recs[:limit], semantic_recs[:limit]))
+            candidates = self._dedupe(self._interleave(rule_based_recs, semantic_recs))[:self.candidate_count]
+            ai_future = self._submit_ai_rerank(
+                cache_key, cache_version, user_input, current_emotion, conversation_summary,
+                limit, snapshot, candidates, local_recs
             )
+            try:
+                return self._copy_result(ai_future.result(timeout=self.ai_deadline))
+            except FutureTimeoutError:
+                logger.warning(f"AI推荐超过{self.ai_deadline}秒未返回，先使用规则推荐")
             
-            return recommended_items, rationale, match_scores
+            return self._build_result(local_recs[:limit], 'rule_based', user_input, current_emotion, conversation_summary)
             
         except Exception as e:
             logger.error(f"内容推荐失败: {e}")
             # 返回默认推荐
             default_recs = content_db.search_content(current_emotion, limit=limit)
-            return default_recs, "根据你的当前状态推荐以下内容", {"default": 0.7}
+            return default_recs, "根据你的当前状态推荐以下内容", {"default": 0.7}, 'default'
+    
+    def _submit_ai_rerank(self,
+                          cache_key: Hashable,
+                          cache_version: Hashable,
+                          user_input: str,
+                          current_emotion: str,
+                          conversation_summary: Dict[str, Any],
+                          limit: int,
+                          snapshot: CatalogSnapshot,
+                          candidates: List[ContentItem],
+                          local_recs: List[ContentItem]) -> Future:
+        """提交AI重排任务；同一缓存键已有进行中的任务时复用它"""
+        with self._pending_lock:
+            future = self._pending.get(cache_key)
+            if future is None:
+                future = self._ai_executor.submit(
+                    self._ai_rerank_task, cache_key, cache_version, user_input, current_emotion,
+                    conversation_summary, limit, snapshot, candidates, local_recs
+                )
+                self._pending[cache_key] = future
+        future.add_done_callback(lambda done: self._release_pending(cache_key, done))
+        return future
+    
+    def _release_pending(self, cache_key: Hashable, future: Future):
+        with self._pending_lock:
+            if self._pending.get(cache_key) is future:
+                del self._pending[cache_key]
+    
+    def _ai_rerank_task(self,
+                        cache_key: Hashable,
+                        cache_version: Hashable,
+                        user_input: str,
+                        current_emotion: str,
+                        conversation_summary: Dict[str, Any],
+                        limit: int,
+                        snapshot: CatalogSnapshot,
+                        candidates: List[ContentItem],
+                        local_recs: List[ContentItem]) -> Tuple[List[ContentItem], str, Dict[str, float], str]:
+        """AI重排并合并结果，写入缓存（无论调用方是否还在等待）"""
+        ai_based_recs = self._ai_based_recommendation(
+            user_input, current_emotion, conversation_summary, limit, snapshot, candidates
+        )
+        
+        # 合并推荐结果，去重：AI重排结果优先，不足时用规则与语义结果交替补齐
+        recommended_items = self._dedupe(ai_based_recs + local_recs)[:limit]
+        strategy = 'ai_rerank' if ai_based_recs else 'rule_based'
+        result = self._build_result(recommended_items, strategy, user_input, current_emotion, conversation_summary)
+        
+        self.cache.put(cache_key, cache_version, result)
+        return result
+    
+    def _build_result(self,
+                      recommended_items: List[ContentItem],
+                      strategy: str,
+                      user_input: str,
+                      current_emotion: str,
+                      conversation_summary: Dict[str, Any]) -> Tuple[List[ContentItem], str, Dict[str, float], str]:
+        """生成推荐理由和匹配度分数"""
+        rationale = self._generate_rationale(
+            recommended_items, user_input, current_emotion, conversation_summary
+        )
+        match_scores = self._calculate_match_scores(
+            recommended_items, user_input, current_emotion, conversation_summary
+        )
+        return recommended_items, rationale, match_scores, strategy
+    
+    @staticmethod
+    def _copy_result(result: Tuple[List[ContentItem], str, Dict[str, float], str]):
+        items, rationale, match_scores, strategy = result
+        return list(items), rationale, dict(match_scores), strategy
     
     def _rule_based_recommendation(self,
-                                  user_input: str,
+                                  user_input: Union[str, AnalyzedText],
                                   current_emotion: str,
                                   conversation_summary: Dict[str, Any],
-                                  limit: int) -> List[ContentItem]:
-        """基于规则的推荐"""
-        all_content = content_db.get_all_content()
-        scored_items = []
+                                  limit: int,
+                                  snapshot: Optional[CatalogSnapshot] = None) -> List[ContentItem]:
+        """基于规则的推荐（在特征矩阵上向量化打分）"""
+        snapshot = snapshot or content_db.snapshot
+        features = snapshot.indexes['features']
         
         # 提取关键词
         keywords = self._extract_keywords(user_input)
         
-        for item in all_content:
-            score = 0.0
-            
-            # 1. 情绪匹配（权重最高）
-            if current_emotion in item.emotion_tags:
-                score += 3.0
-            for emotion_tag in item.emotion_tags:
-                if emotion_tag in self.emotion_weights:
-                    if current_emotion in self.emotion_weights[emotion_tag]:
-                        score += 2.0
-            
-            # 2. 关键词匹配
-            for keyword in keywords:
-                if keyword in item.title.lower() or keyword in ' '.join(item.tags).lower():
-                    score += 2.0
-            
-            # 3. 关切点匹配
-            key_concerns = conversation_summary.get('key_concerns', [])
-            for concern in key_concerns:
-                if concern in item.tags or concern in item.category:
-                    score += 1.5
-            
-            # 4. 对话阶段匹配（难度适配）
-            stage = conversation_summary.get('conversation_stage', 'initial')
-            depth = self.stage_depth_mapping.get(stage, 'beginner')
-            if isinstance(depth, list):
-                if item.difficulty in depth:
-                    score += 1.0
-            elif item.difficulty == depth:
-                score += 1.0
-            
-            # 5. 热度加权
-            score += item.popularity * 0.01
-            
-            if score > 0:
-                scored_items.append((score, item))
+        stage = conversation_summary.get('conversation_stage', 'initial')
+        
+        # 按分数取前limit项（命中候选表时只对候选行打分）；个别记录校验失败时多取一些补齐
+        fetch = limit
+        while True:
+            ranked_ids = features.rank(
+                current_emotion=current_emotion,
+                keywords=keywords,
+                key_concerns=conversation_summary.get('key_concerns', []),
+                depth=self.stage_depth_mapping.get(stage, 'beginner'),
+                emotion_weights=self.emotion_weights,
+                limit=fetch
+            )
+            items = [item for item in map(snapshot.items.get, ranked_ids) if item is not None]
+            if len(items) >= limit or len(ranked_ids) < fetch:
+                return items[:limit]
+            fetch *= 2
+    
+    def _semantic_recommendation(self,
+                                 user_input: Union[str, AnalyzedText],
+                                 limit: int,
+                                 snapshot: Optional[CatalogSnapshot] = None,
+                                 min_score: float = 0.02) -> List[ContentItem]:
+        """基于向量相似度的语义推荐（本地计算，无网络请求）"""
+        snapshot = snapshot or content_db.snapshot
+        vector_index = snapshot.indexes.get('vectors')
+        if vector_index is None:
+            return []
         
-        # 按分数排序
-        scored_items.sort(key=lambda x: x[0], reverse=True)
-        return [item for score, item in scored_items[:limit]]
+        results = []
+        tokens = AnalyzedText.of(user_input).tokens
+        for content_id, _ in vector_index.search(tokens, top_k=limit, min_score=min_score):
+            item = snapshot.items.get(content_id)
+            if item:
+                results.append(item)
+        return results
+    
+    @staticmethod
+    def _dedupe(items: List[ContentItem]) -> List[ContentItem]:
+        """按ID去重，保留首次出现的顺序"""
+        seen = {}
+        for item in items:
+            if item.id not in seen:
+                seen[item.id] = item
+        return list(seen.values())
+    
+    @staticmethod
+    def _interleave(*ranked_lists: List[ContentItem]) -> List[ContentItem]:
+        """交替合并多个有序列表"""
+        merged = []
+        for group in zip_longest(*ranked_lists):
+            merged.extend(item for item in group if item is not None)
+        return merged
+    
+    def _retrieve_candidates(self,
+                             user_input: Union[str, AnalyzedText],
+                             current_emotion: str,
+                             conversation_summary: Dict[str, Any],
+                             snapshot: Optional[CatalogSnapshot] = None) -> List[ContentItem]:
+        """候选召回：规则与语义检索各取前N，交替合并去重"""
+        snapshot = snapshot or content_db.snapshot
+        user_input = AnalyzedText.of(user_input)
+        rule_based_recs = self._rule_based_recommendation(
+            user_input, current_emotion, conversation_summary, self.candidate_count, snapshot
+        )
+        semantic_recs = self._semantic_recommendation(user_input, self.candidate_count, snapshot)
+        return self._dedupe(self._interleave(rule_based_recs, semantic_recs))[:self.candidate_count]
     
     def _ai_based_recommendation(self,
                                 user_input: str,
                                 current_emotion: str,
                                 conversation_summary: Dict[str, Any],
-                                limit: int) -> List[ContentItem]:
-        """基于AI的智能推荐"""
+                                limit: int,
+                                snapshot: Optional[CatalogSnapshot] = None,
+                                candidates: Optional[List[ContentItem]] = None) -> List[ContentItem]:
+        """
+        基于AI的智能推荐（检索-重排）
+        
+        先由本地策略召回少量候选，只把候选的精简信息交给AI重排，
+        AI以JSON返回内容ID，提示词大小与目录规模无关。
+        """
         try:
+            if candidates is None:
+                candidates = self._retrieve_candidates(
+                    user_input, current_emotion, conversation_summary, snapshot
+                )
+            if not candidates:
+                return []
+            candidate_map = {item.id: item for item in candidates}
+            
             # 构建系统提示词
-            system_prompt = """你是一个心理内容推荐专家。请根据用户的情况,从以下内容库中选择最合适的3个推荐。
+            system_prompt = f"""你是一个心理内容推荐专家。请根据用户的情况，从候选内容中选出最合适的{limit}个，按推荐优先级排序。
             考虑因素：
             1. 用户的当前情绪状态
             2. 用户的表达内容
             3. 对话阶段和深度
             4. 内容的匹配度和实用性
             
-            请返回内容ID列表,格式:["id1", "id2", "id3"]"""
-            
-            # 获取所有内容描述
-            all_content = content_db.get_all_content()
-            content_descriptions = []
-            for item in all_content:
-                desc = f"ID: {item.id} | 标题: {item.title} | 类型: {item.type} | 描述: {item.description} | 标签: {', '.join(item.tags)}"
-                content_descriptions.append(desc)
+            只返回JSON对象，格式：{{"ids": ["id1", "id2"]}}，ID必须来自候选内容。"""
             
+            candidate_records = json.dumps(
+                [self._compact_record(item) for item in candidates], ensure_ascii=False
+            )
             user_prompt = f"""用户输入: {user_input}
             当前情绪: {current_emotion}
             对话阶段: {conversation_summary.get('conversation_stage', 'initial')}
             关切点: {', '.join(conversation_summary.get('key_concerns', []))}
             
-            可用内容:
-            {'\n'.join(content_descriptions[:20])}  # 限制数量避免token过多
-            
-            请推荐最合适的3个内容ID:"""
+            候选内容:
+            {candidate_records}"""
             
-            response = self.client.chat.completions.create(
+            response = llm_scheduler.create(
+                self.client, BACKGROUND,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.3,
-                max_tokens=100
+                max_tokens=100,
+                response_format={"type": "json_object"},
+                timeout=self.ai_request_timeout
             )
             
             # 解析响应
             response_text = response.choices[0].message.content.strip()
             logger.info(f"AI推荐响应: {response_text}")
             
-            # 提取内容ID
-            content_ids = []
-            import re
-            id_pattern = r'["\']([a-zA-Z0-9_]+)["\']'
-            matches = re.findall(id_pattern, response_text)
-            
-            for content_id in matches[:limit]:
-                content_item = content_db.get_content_by_id(content_id)
-                if content_item:
-                    content_ids.append(content_item)
-            
-            return content_ids
+            ranked = []
+            for content_id in self._parse_ranked_ids(response_text):
+                if content_id in candidate_map and candidate_map[content_id] not in ranked:
+                    ranked.append(candidate_map[content_id])
+            return ranked[:limit]
             
         except Exception as e:
             logger.error(f"AI推荐失败: {e}")
             return []
     
-    def _extract_keywords(self, text: str) -> List[str]:
-        """从文本中提取关键词"""
-        # 简单的中文关键词提取
-        chinese_words = re.findall(r'[\u4e00-\u9fa5]{2,}', text)
-        
-        # 心理相关关键词增强
-        psych_keywords = [
-            "压力", "焦虑", "抑郁", "情绪", "学习", "考试", "工作",
-            "关系", "朋友", "家人", "未来", "迷茫", "自我", "自信",
-            "睡眠", "饮食", "运动", "放松", "冥想", "正念"
-        ]
-        
-        keywords = list(set(chinese_words))
-        
-        # 添加匹配的心理关键词
-        for kw in psych_keywords:
-            if kw in text and kw not in keywords:
-                keywords.append(kw)
-        
-        return keywords
+    def _compact_record(self, item: ContentItem) -> Dict[str, Any]:
+        """候选内容的精简表示，控制提示词长度"""
+        return {
+            "id": item.id,
+            "title": item.title,
+            "type": item.type,
+            "tags": item.tags[:4],
+            "difficulty": item.difficulty,
+            "summary": item.description[:40]
+        }
+    
+    def _parse_ranked_ids(self, response_text: str) -> List[str]:
+        """解析AI返回的JSON内容ID列表"""
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            logger.warning(f"AI推荐响应不是有效JSON: {response_text[:100]}")
+            return []
+        if isinstance(data, dict):
+            data = data.get('ids', [])
+        if not isinstance(data, list):
+            return []
+        return [str(content_id) for content_id in data]
+    
+    def _extract_keywords(self, text: Union[str, AnalyzedText]) -> List[str]:
+        """从文本中提取关键词（连续中文片段 + 心理相关关键词，见 AnalyzedText.keywords）"""
+        return AnalyzedText.of(text).keywords
     
     def _generate_rationale(self,
                            recommended_items: List[ContentItem],
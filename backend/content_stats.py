@@ -0,0 +1,138 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Tuple
+from utils import record_field
+
+
+class ContentStats:
+    """
+    物化的内容统计视图
+
+    按类型/分类的计数在添加内容时增量更新，热门榜（top-K）在热度变化时增量维护，
+    查询只需 O(K)。
+    """
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.by_type: Dict[str, int] = {}
+        self.by_category: Dict[str, int] = {}
+        # id -> [type, category, popularity, seq, title]
+        self._entries: Dict[str, List[Any]] = {}
+        self._next_seq = 0
+        # 热门榜，按 (-popularity, seq) 升序，即热度降序、同热度按目录顺序
+        self._top: List[Tuple[int, int, str]] = []
+        self.top_epoch = 0  # 热门榜成员变化时递增
+
+    @classmethod
+    def build(cls, records: Iterable[Any], top_k: int = 10) -> "ContentStats":
+        """从内容记录全量构建统计视图"""
+        stats = cls(top_k)
+        for record in records:
+            stats._add_entry(record)
+        stats._rebuild_top()
+        return stats
+
+    def copy(self) -> "ContentStats":
+        """可独立修改的副本（写时复制用）"""
+        clone = ContentStats(self.top_k)
+        clone.by_type = dict(self.by_type)
+        clone.by_category = dict(self.by_category)
+        clone._entries = dict(self._entries)
+        clone._next_seq = self._next_seq
+        clone._top = list(self._top)
+        clone.top_epoch = self.top_epoch
+        return clone
+
+    @property
+    def total_count(self) -> int:
+        return len(self._entries)
+
+    def add(self, record: Any):
+        """添加或覆盖一个内容项"""
+        content_id = record_field(record, 'id')
+        previous = self._entries.get(content_id)
+        self._add_entry(record)
+
+        if previous is not None and self._in_top(content_id):
+            # 覆盖已上榜内容可能导致热度下降，榜外内容可能需要补位
+            self._rebuild_top()
+        else:
+            self._offer(content_id)
+
+    def update_popularity(self, content_id: str, popularity: int):
+        """热度变化后更新热门榜（热度只增不减）"""
+        entry = self._entries.get(content_id)
+        if entry is None:
+            return
+        # 条目可能与副本共享，替换而不是原地修改
+        entry = self._entries[content_id] = list(entry)
+        entry[2] = popularity
+        if self._in_top(content_id):
+            self._top = sorted((-self._entries[cid][2], seq, cid) for _, seq, cid in self._top)
+        else:
+            self._offer(content_id)
+
+    def top_ids(self) -> List[str]:
+        """热门榜内容ID（热度降序）"""
+        return [content_id for _, _, content_id in self._top]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计结果"""
+        return {
+            "total_count": self.total_count,
+            "by_type": dict(self.by_type),
+            "by_category": dict(self.by_category),
+            "top_popular": [
+                {"id": content_id, "title": self._entries[content_id][4], "popularity": -neg_popularity}
+                for neg_popularity, _, content_id in self._top
+            ]
+        }
+
+    def _add_entry(self, record: Any):
+        content_id = record_field(record, 'id')
+        previous = self._entries.get(content_id)
+        if previous is not None:
+            self._decrement(self.by_type, previous[0])
+            self._decrement(self.by_category, previous[1])
+            seq = previous[3]
+        else:
+            seq = self._next_seq
+            self._next_seq += 1
+
+        item_type = record_field(record, 'type', '')
+        category = record_field(record, 'category', '')
+        self.by_type[item_type] = self.by_type.get(item_type, 0) + 1
+        self.by_category[category] = self.by_category.get(category, 0) + 1
+        self._entries[content_id] = [
+            item_type, category, record_field(record, 'popularity', 0), seq, record_field(record, 'title', '')
+        ]
+
+    def _in_top(self, content_id: str) -> bool:
+        return any(cid == content_id for _, _, cid in self._top)
+
+    def _offer(self, content_id: str):
+        """尝试让内容进入热门榜"""
+        entry = self._entries[content_id]
+        candidate = (-entry[2], entry[3], content_id)
+        if len(self._top) < self.top_k:
+            self._top.append(candidate)
+        elif candidate < self._top[-1]:
+            self._top[-1] = candidate
+        else:
+            return
+        self._top.sort()
+        self.top_epoch += 1
+
+    def _rebuild_top(self):
+        previous = set(self.top_ids())
+        self._top = heapq.nsmallest(
+            self.top_k,
+            ((-entry[2], entry[3], content_id) for content_id, entry in self._entries.items())
+        )
+        if set(self.top_ids()) != previous:
+            self.top_epoch += 1
+
+    @staticmethod
+    def _decrement(counter: Dict[str, int], key: str):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
@@ -0,0 +1,246 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils import record_field, record_strings, record_text
+
+
+class _TrieNode:
+    """
+    前缀树节点
+
+    children 为 None 时是叶子桶：terms 存放该前缀下的全部词条；
+    否则 terms 只存放恰好等于该前缀的词条，其余词条在子节点中。
+    top 为该前缀下按热度排好的前N个词条。
+    """
+    __slots__ = ('children', 'terms', 'top')
+
+    def __init__(self, terms: Optional[List[int]] = None):
+        self.children: Optional[Dict[str, "_TrieNode"]] = None
+        self.terms: List[int] = terms if terms is not None else []
+        self.top: List[int] = []
+
+    def clone(self) -> "_TrieNode":
+        """复制子树（top 只会整体替换，可以共享）"""
+        node = _TrieNode(list(self.terms))
+        node.top = self.top
+        if self.children is not None:
+            node.children = {char: child.clone() for char, child in self.children.items()}
+        return node
+
+
+class ContentSuggestIndex:
+    """
+    标题和标签的前缀联想索引
+
+    词条为小写后的标题和标签，权重为含该词条的内容的最高热度。
+    前缀树的每个节点携带预先排好的前N个词条，查询只需沿前缀走到节点直接返回；
+    词条较少的子树合并为叶子桶（超过 BURST_SIZE 时才拆分），控制节点数量。
+    添加内容和热度增加时沿路径增量更新各节点的前N；覆盖已有内容时整体重建。
+    """
+
+    TOP_N = 10
+    BURST_SIZE = 32
+
+    def __init__(self):
+        self._root = _TrieNode()
+        # 词条表：词条ID -> 小写文本 / 原始文本 / 类型 / {内容ID: 热度}
+        self._texts: List[str] = []
+        self._display: List[str] = []
+        self._kinds: List[str] = []
+        self._items: List[Dict[str, int]] = []
+        self._weights: List[int] = []
+        self._term_of: Dict[Tuple[str, str], int] = {}
+        self._item_terms: Dict[str, List[int]] = {}
+
+    @classmethod
+    def build(cls, records: Iterable[Any]) -> "ContentSuggestIndex":
+        """从内容记录全量构建"""
+        index = cls()
+        index.add_many(records)
+        return index
+
+    def copy(self) -> "ContentSuggestIndex":
+        """可独立修改的副本（写时复制用）"""
+        clone = ContentSuggestIndex()
+        clone._root = self._root.clone()
+        clone._texts = list(self._texts)
+        clone._display = list(self._display)
+        clone._kinds = list(self._kinds)
+        clone._items = [dict(items) for items in self._items]
+        clone._weights = list(self._weights)
+        clone._term_of = dict(self._term_of)
+        clone._item_terms = dict(self._item_terms)
+        return clone
+
+    def add(self, record: Any):
+        self.add_many([record])
+
+    def add_many(self, records: Iterable[Any]):
+        """添加或覆盖内容"""
+        bulk = not self._item_terms
+        overwritten = False
+        new_terms, raised = [], set()
+        for record in records:
+            content_id = record_field(record, 'id')
+            popularity = record_field(record, 'popularity', 0)
+            if content_id in self._item_terms:
+                overwritten = True
+                for term in self._item_terms[content_id]:
+                    self._items[term].pop(content_id, None)
+
+            terms = []
+            for kind, text in [('title', record_text(record, 'title'))] + \
+                              [('tag', tag) for tag in record_strings(record, 'tags')]:
+                if not text.strip():
+                    continue
+                term = self._term_of.get((text.lower(), kind))
+                if term is None:
+                    term = self._new_term(text, kind)
+                if not self._items[term]:
+                    # 新词条，或之前已无内容引用、不在前缀树中的词条
+                    new_terms.append(term)
+                elif popularity > self._weights[term]:
+                    raised.add(term)
+                self._items[term][content_id] = popularity
+                self._weights[term] = max(self._weights[term], popularity)
+                terms.append(term)
+            self._item_terms[content_id] = terms
+
+        if overwritten:
+            # 覆盖可能降低词条权重或移除词条，增量维护的前N无法保证正确，整体重建
+            self._rebuild()
+            return
+        if bulk:
+            self._bulk_load(new_terms)
+            return
+        for term in new_terms:
+            self._insert(term)
+        for term in raised.difference(new_terms):
+            self._reoffer(term)
+
+    def update_popularity(self, content_id: str, popularity: int):
+        """内容热度增加后更新相关词条（热度只增不减）"""
+        for term in self._item_terms.get(content_id, []):
+            self._items[term][content_id] = popularity
+            if popularity > self._weights[term]:
+                self._weights[term] = popularity
+                self._reoffer(term)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按前缀返回联想词条，按热度降序"""
+        prefix = prefix.lower()
+        limit = min(limit, self.TOP_N)
+        node = self._root
+        for depth, char in enumerate(prefix):
+            if node.children is None:
+                # 叶子桶：词条很少，直接过滤
+                matches = [term for term in node.terms if self._texts[term].startswith(prefix)]
+                return [self._entry(term) for term in sorted(matches, key=self._rank_key)[:limit]]
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self._entry(term) for term in node.top[:limit]]
+
+    def _entry(self, term: int) -> Dict[str, Any]:
+        items = self._items[term]
+        return {
+            "text": self._display[term],
+            "kind": self._kinds[term],
+            "content_id": max(items, key=items.get) if items else None,
+            "count": len(items),
+            "popularity": self._weights[term]
+        }
+
+    def _rank_key(self, term: int) -> Tuple[int, str]:
+        return -self._weights[term], self._texts[term]
+
+    def _new_term(self, text: str, kind: str) -> int:
+        term = len(self._texts)
+        self._texts.append(text.lower())
+        self._display.append(text)
+        self._kinds.append(kind)
+        self._items.append({})
+        self._weights.append(0)
+        self._term_of[(text.lower(), kind)] = term
+        return term
+
+    def _insert(self, term: int, root: Optional[_TrieNode] = None, offer: bool = True):
+        """把词条插入前缀树，沿路径更新各节点的前N（offer=False 时由 _fill_top 统一计算）"""
+        text = self._texts[term]
+        node = root or self._root
+        depth = 0
+        while True:
+            if offer:
+                self._offer(node, term)
+            if node.children is None:
+                node.terms.append(term)
+                if len(node.terms) > self.BURST_SIZE:
+                    self._burst(node, depth, offer)
+                return
+            if depth == len(text):
+                node.terms.append(term)
+                return
+            child = node.children.get(text[depth])
+            if child is None:
+                child = node.children[text[depth]] = _TrieNode()
+            node = child
+            depth += 1
+
+    def _burst(self, node: _TrieNode, depth: int, offer: bool = True):
+        """叶子桶过大时按下一个字符拆分为子节点"""
+        children: Dict[str, _TrieNode] = {}
+        stay = []
+        for term in node.terms:
+            text = self._texts[term]
+            if len(text) == depth:
+                stay.append(term)
+            else:
+                children.setdefault(text[depth], _TrieNode()).terms.append(term)
+        if not children:
+            return
+        for child in children.values():
+            if offer:
+                child.top = sorted(child.terms, key=self._rank_key)[:self.TOP_N]
+            if len(child.terms) > self.BURST_SIZE:
+                self._burst(child, depth + 1, offer)
+        node.terms = stay
+        node.children = children
+
+    def _reoffer(self, term: int):
+        """词条权重提高后，沿路径重新参与各节点的前N"""
+        text = self._texts[term]
+        node = self._root
+        depth = 0
+        while node is not None:
+            self._offer(node, term)
+            if node.children is None or depth == len(text):
+                return
+            node = node.children.get(text[depth])
+            depth += 1
+
+    def _offer(self, node: _TrieNode, term: int):
+        top = node.top
+        if term in top:
+            node.top = sorted(top, key=self._rank_key)
+        elif len(top) < self.TOP_N or self._rank_key(term) < self._rank_key(top[-1]):
+            node.top = sorted(top + [term], key=self._rank_key)[:self.TOP_N]
+
+    def _rebuild(self):
+        """丢弃不再被任何内容引用的词条，重算权重并重建前缀树"""
+        for term, items in enumerate(self._items):
+            self._weights[term] = max(items.values()) if items else 0
+        self._bulk_load([term for term, items in enumerate(self._items) if items])
+
+    def _bulk_load(self, terms: List[int]):
+        """批量建树：先插入全部词条，再自底向上计算各节点的前N，建好后再替换"""
+        root = _TrieNode()
+        for term in terms:
+            self._insert(term, root, offer=False)
+        self._fill_top(root)
+        self._root = root
+
+    def _fill_top(self, node: _TrieNode) -> List[int]:
+        candidates = list(node.terms)
+        for child in (node.children or {}).values():
+            candidates.extend(self._fill_top(child))
+        node.top = heapq.nsmallest(self.TOP_N, candidates, key=self._rank_key)
+        return node.top
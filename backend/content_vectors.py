@@ -0,0 +1,263 @@
+import copy
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from utils import GrowableArray, record_field, record_strings, record_text
+
+_CJK_RUN = re.compile(r'[\u4e00-\u9fa5]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    文本切分为检索特征：中文按字的一元和二元组，英文/数字按词
+
+    字符n-gram不依赖分词词典，"睡不着" 与 "入睡"、"睡眠" 等也能通过共享字符召回。
+    """
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        tokens += run
+        tokens += [run[i:i + 2] for i in range(len(run) - 1)]
+    tokens += _WORD.findall(text)
+    return tokens
+
+
+def _item_term_counts(record: Any) -> Counter:
+    """内容项的词频（标题和标签加权）"""
+    weighted = tokenize(record_text(record, 'title'))
+    for tag in record_strings(record, 'tags'):
+        weighted += tokenize(tag)
+    return Counter(tokenize(record_text(record, 'description')) + weighted * 2)
+
+
+class ContentVectorIndex:
+    """
+    内容向量索引（TF-IDF字符n-gram，稀疏矩阵 + NumPy）
+
+    矩阵按列（词）压缩存储词频，IDF在查询端乘入，
+    因此新增内容只需追加非零元，不必重算已有行；
+    增量部分超过一定比例时合并压缩并重算IDF和行范数。
+    查询为一次只触及查询词所在列的稀疏矩阵-向量乘法，再用 argpartition 取 top-k。
+    """
+
+    COMPACT_RATIO = 0.2
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._df = GrowableArray(np.int32)
+        self._norms = GrowableArray(np.float32)
+        self._alive = GrowableArray(np.bool_)
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._n_docs = 0
+        # 已压缩部分（按列CSC）
+        self._base_rows = 0
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        # 增量部分（COO）
+        self._delta_rows = GrowableArray(np.int32)
+        self._delta_cols = GrowableArray(np.int32)
+        self._delta_data = GrowableArray(np.float32)
+
+    @classmethod
+    def build(cls, records: Iterable[Any]) -> "ContentVectorIndex":
+        """从内容记录全量构建索引"""
+        index = cls()
+        index._append(records)
+        index._compact()
+        return index
+
+    def copy(self) -> "ContentVectorIndex":
+        """可独立修改的副本（写时复制用）；已压缩部分和IDF只会整体替换，直接共享"""
+        clone = copy.copy(self)
+        clone.vocab = dict(self.vocab)
+        clone.ids = list(self.ids)
+        clone._row_of = dict(self._row_of)
+        for name in ('_df', '_norms', '_alive', '_delta_rows', '_delta_cols', '_delta_data'):
+            setattr(clone, name, getattr(self, name).copy())
+        return clone
+
+    def add(self, item: Any):
+        self.add_many([item])
+
+    def add_many(self, items: List[Any]):
+        """增量添加（或覆盖）内容"""
+        self._append(items)
+        if self._delta_rows.size and len(self.ids) - self._base_rows > self.COMPACT_RATIO * max(self._base_rows, 1):
+            self._compact()
+        else:
+            self._refresh_idf()
+            self._update_norms(range(len(self.ids) - len(items), len(self.ids)))
+
+    def update_popularity(self, content_id: str, popularity: int):
+        """热度不影响向量"""
+        pass
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def search(self, text: Union[str, List[str]], top_k: int = 10, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """返回与文本余弦相似度最高的 (内容ID, 相似度) 列表（也可直接传入 tokenize 的结果）"""
+        query = Counter(tokenize(text) if isinstance(text, str) else text)
+        # 行数和IDF只读一次；ids 在新行的其他数组就绪后才增长，超出 n 的行忽略
+        n = len(self.ids)
+        idf = self._idf
+        df = self._df.view
+        cols, weights = [], []
+        for term, count in query.items():
+            col = self.vocab.get(term)
+            # 只在被覆盖内容中出现过的词（DF为0）与全量构建一致地忽略
+            if col is not None and col < len(idf) and df[col] > 0:
+                cols.append(col)
+                weights.append((1.0 + math.log(count)) * idf[col])
+        if not cols or not n:
+            return []
+
+        weights = np.asarray(weights, dtype=np.float32)
+        q_norm = float(np.linalg.norm(weights))
+        # 查询向量在查询端乘入IDF：score_d = Σ_t tf_dt * idf_t * q_t
+        q = np.zeros(len(idf), dtype=np.float32)
+        q[cols] = weights * idf[cols]
+
+        rows_parts, value_parts = [], []
+        for col in cols:
+            if col + 1 < len(self._indptr):
+                start, end = self._indptr[col], self._indptr[col + 1]
+                rows_parts.append(self._indices[start:end])
+                value_parts.append(self._data[start:end] * q[col])
+        if self._delta_rows.size:
+            size = min(self._delta_rows.size, self._delta_cols.size, self._delta_data.size)
+            delta_rows = self._delta_rows.view[:size]
+            delta_cols = self._delta_cols.view[:size]
+            mask = (delta_rows < n) & (delta_cols < len(q))
+            mask[mask] = q[delta_cols[mask]] != 0
+            rows_parts.append(delta_rows[mask])
+            value_parts.append(self._delta_data.view[:size][mask] * q[delta_cols[mask]])
+
+        scores = np.bincount(np.concatenate(rows_parts), weights=np.concatenate(value_parts),
+                             minlength=n).astype(np.float32)
+        norms = self._norms.view[:n]
+        scores = np.divide(scores, norms * q_norm, out=np.zeros_like(scores), where=norms > 0)
+        scores[~self._alive.view[:n]] = 0.0
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.ids[row], float(scores[row])) for row in top if scores[row] > min_score]
+
+    def _append(self, records: Iterable[Any]):
+        """
+        追加内容行到增量部分
+
+        新行的各数组先在本地构建，写入时 ids 最后增长，查询不会看到行数不一致的状态。
+        覆盖已有内容时，旧行标记为无效并从DF中减去其词。
+        """
+        rows, cols, data = [], [], []
+        vocab = self.vocab
+        first_row = len(self.ids)
+        new_ids: List[str] = []
+        new_row_of: Dict[str, int] = {}
+        alive: List[bool] = []
+        replaced: List[int] = []
+        added_docs = 0
+        for record in records:
+            content_id = record_field(record, 'id')
+            previous = new_row_of.get(content_id, self._row_of.get(content_id))
+            if previous is None:
+                added_docs += 1
+            elif previous >= first_row:
+                # 同一批内重复的ID，只保留最后一次
+                alive[previous - first_row] = False
+            else:
+                replaced.append(previous)
+            row = first_row + len(new_ids)
+            new_ids.append(content_id)
+            new_row_of[content_id] = row
+            alive.append(True)
+
+            counts = _item_term_counts(record)
+            for term in counts:
+                if term not in vocab:
+                    vocab[term] = len(vocab)
+            rows += [row] * len(counts)
+            cols += [vocab[term] for term in counts]
+            data += counts.values()
+
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        alive = np.asarray(alive, dtype=np.bool_)
+        # DF只计入仍然有效的新行，并减去被覆盖行的词
+        df = np.bincount(cols[alive[rows - first_row]], minlength=len(vocab))
+        if replaced:
+            df -= np.bincount(self._row_columns(replaced), minlength=len(vocab))
+
+        self._alive.extend(alive)
+        self._norms.extend(np.zeros(len(alive), dtype=np.float32))
+        self._df.extend(np.zeros(len(vocab) - self._df.size, dtype=np.int32))
+        self._df.view[:] += df.astype(np.int32)
+        self._delta_rows.extend(rows)
+        self._delta_cols.extend(cols)
+        self._delta_data.extend(1.0 + np.log(np.asarray(data, dtype=np.float32)))
+        if replaced:
+            self._alive.view[replaced] = False
+        self._n_docs += added_docs
+        self._row_of.update(new_row_of)
+        self.ids.extend(new_ids)
+
+    def _row_columns(self, rows: List[int]) -> np.ndarray:
+        """已有行包含的词列（每行每个词一次）"""
+        positions = np.flatnonzero(np.isin(self._indices, rows))
+        base_cols = np.searchsorted(self._indptr, positions, side='right') - 1
+        delta_cols = self._delta_cols.view[np.isin(self._delta_rows.view, rows)]
+        return np.concatenate([base_cols, delta_cols]).astype(np.int64)
+
+    def _refresh_idf(self):
+        df = self._df.view.astype(np.float32)
+        self._idf = (np.log((1.0 + self._n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def _update_norms(self, rows):
+        """按当前IDF计算新增行的范数"""
+        rows = np.asarray(list(rows), dtype=np.int32)
+        delta_rows = self._delta_rows.view
+        mask = np.isin(delta_rows, rows)
+        weighted = self._delta_data.view[mask] * self._idf[self._delta_cols.view[mask]]
+        sums = np.bincount(delta_rows[mask], weights=weighted ** 2, minlength=len(self.ids))
+        self._norms.view[rows] = np.sqrt(sums[rows])
+
+    def _compact(self):
+        """合并增量部分为CSC，丢弃被覆盖的行，并重算DF、IDF和全部行范数"""
+        n_cols = len(self.vocab)
+        base_cols = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr))
+        rows = np.concatenate([self._indices, self._delta_rows.view])
+        cols = np.concatenate([base_cols, self._delta_cols.view])
+        data = np.concatenate([self._data, self._delta_data.view])
+
+        alive = self._alive.view
+        keep = alive[rows]
+        rows, cols, data = rows[keep], cols[keep], data[keep]
+
+        order = np.argsort(cols, kind='stable')
+        self._indices = rows[order]
+        self._data = data[order]
+        counts = np.bincount(cols, minlength=n_cols)
+        self._indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        self._df = GrowableArray(np.int32, max(n_cols, 1024))
+        self._df.extend(counts)
+        self._n_docs = int(alive.sum())
+        self._refresh_idf()
+
+        weighted = data * self._idf[cols]
+        self._norms.view[:] = np.sqrt(np.bincount(rows, weights=weighted ** 2, minlength=len(self.ids)))
+
+        self._base_rows = len(self.ids)
+        self._delta_rows = GrowableArray(np.int32)
+        self._delta_cols = GrowableArray(np.int32)
+        self._delta_data = GrowableArray(np.float32)
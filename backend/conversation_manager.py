@@ -1,6 +1,8 @@
 #conversation_manager.py
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Union
+
+from text_analysis import AnalyzedText
 
 class ConversationManager:
     """管理对话上下文和情绪演变"""
@@ -23,8 +25,10 @@ class ConversationManager:
         return self.sessions[key]
     
     def add_interaction(self, user_id: str, session_id: str, 
-                        user_input: str, emotion: str, ai_response: str):
-        """添加一次完整交互"""
+                        user_input: Union[str, AnalyzedText], emotion: str, ai_response: str):
+        """添加一次完整交互（user_input 可以是请求入口已创建的 AnalyzedText）"""
+        analysis = AnalyzedText.of(user_input)
+        user_input = analysis.text
         session = self.get_or_create_session(user_id, session_id)
         
         # 添加到历史
@@ -50,7 +54,7 @@ class ConversationManager:
         self._analyze_conversation_stage(session)
         
         # 提取关键关切点
-        self._extract_key_concerns(session, user_input)
+        self._extract_key_concerns(session, analysis)
         
         session['last_active'] = datetime.now()
         
@@ -69,20 +73,12 @@ class ConversationManager:
         else:
             session['conversation_stage'] = 'resolving'
     
-    def _extract_key_concerns(self, session: Dict, user_input: str):
+    def _extract_key_concerns(self, session: Dict, analysis: AnalyzedText):
         """提取关键关切点"""
-        # 简单关键词提取，实际可更复杂
-        concern_keywords = {
-            'relationship': ['对象', '男朋友', '女朋友', '室友', '朋友', '关系'],
-            'academic': ['考试', '学习', '论文', '毕业', '成绩', '复习'],
-            'future': ['将来', '未来', '以后', '规划', '方向'],
-            'self': ['我', '自己', '个人', '性格', '习惯']
-        }
-        
-        for concern_type, keywords in concern_keywords.items():
-            if any(keyword in user_input for keyword in keywords):
-                if concern_type not in session['key_concerns']:
-                    session['key_concerns'].append(concern_type)
+        # 关切点关键词来自可热加载的检测配置
+        for concern_type in analysis.concerns:
+            if concern_type not in session['key_concerns']:
+                session['key_concerns'].append(concern_type)
         
         # 保持最多5个关切点
         session['key_concerns'] = session['key_concerns'][:5]
@@ -124,4 +120,49 @@ class ConversationManager:
             'recent_emotions': emotions[-3:] if len(emotions) >= 3 else emotions
         }
     
+    def mark_recommendations_pending(self, user_id: str, session_id: str, turn: int):
+        """标记该轮的推荐正在后台生成"""
+        session = self.get_or_create_session(user_id, session_id)
+        session['recommendations'] = {
+            'status': 'pending',
+            'turn': turn,
+            'recommendations': [],
+            'rationale': '',
+            'strategy': None,
+            'updated_at': datetime.now().isoformat()
+        }
+    
+    def set_recommendations(self, user_id: str, session_id: str, turn: int,
+                            recommendations: List[Any], rationale: str, strategy: Optional[str],
+                            status: str = 'ready'):
+        """保存后台生成的推荐；会话已被清除或已有更新一轮的推荐时丢弃"""
+        session = self.sessions.get(f"{user_id}_{session_id}")
+        if session is None:
+            return
+        current = session.get('recommendations')
+        if current and current['turn'] > turn:
+            return
+        session['recommendations'] = {
+            'status': status,
+            'turn': turn,
+            'recommendations': recommendations,
+            'rationale': rationale,
+            'strategy': strategy,
+            'updated_at': datetime.now().isoformat()
+        }
+    
+    def get_recommendations(self, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """获取会话最近一次推荐（不存在的会话返回None，不会创建会话）"""
+        session = self.sessions.get(f"{user_id}_{session_id}")
+        if session is None:
+            return None
+        return session.get('recommendations') or {
+            'status': 'none',
+            'turn': None,
+            'recommendations': [],
+            'rationale': '',
+            'strategy': None,
+            'updated_at': None
+        }
+    
 conversation_manager=ConversationManager()
\ No newline at end of file
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import config
+from utils import FileWatcher
+
+logger = logging.getLogger(__name__)
+
+# 内置规则：配置文件缺失或从未加载成功时使用
+DEFAULT_RULES: Dict[str, Any] = {
+    "version": "builtin",
+    # 紧急关键词 - 需要立即干预
+    "urgent_keywords": [
+        "自杀", "不想活了", "结束生命", "绝望", "活够了",
+        "想死", "死掉", "离开世界", "生命没意义", "自我了断",
+        "跳楼", "割腕", "服毒", "上吊", "烧炭", "安乐死"
+    ],
+    # 警告关键词 - 需要密切关注
+    "warning_keywords": [
+        "活不下去", "没意思", "太痛苦", "撑不住", "崩溃",
+        "想消失", "人间不值得", "好累", "绝望", "无助",
+        "没人理解", "孤独", "被抛弃", "没有希望", "想放弃"
+    ],
+    # 情绪增强因子
+    "emotion_enhancers": {
+        "抑郁": 2.0,
+        "焦虑": 1.5,
+        "愤怒": 1.2,
+        "压力": 1.3
+    },
+    # 关切点关键词
+    "concern_keywords": {
+        "relationship": ["对象", "男朋友", "女朋友", "室友", "朋友", "关系"],
+        "academic": ["考试", "学习", "论文", "毕业", "成绩", "复习"],
+        "future": ["将来", "未来", "以后", "规划", "方向"],
+        "self": ["我", "自己", "个人", "性格", "习惯"]
+    },
+    # 情绪到内容的映射权重
+    "emotion_weights": {
+        "学业压力": ["academic", "stress_management"],
+        "焦虑": ["relaxation", "mindfulness", "anxiety"],
+        "抑郁": ["self_reflection", "mood_management"],
+        "愤怒": ["anger_management", "emotional_regulation"],
+        "压力": ["stress_management", "relaxation"],
+        "人际矛盾": ["relationship", "communication"],
+        "困惑": ["self_reflection", "decision_making"],
+        "不确定": ["future", "decision_making"],
+        "未来迷茫": ["future", "career_planning"],
+        "自我怀疑": ["self_esteem", "self_reflection"],
+        "孤独": ["relationship", "social_skills"],
+        "失眠": ["sleep", "relaxation"]
+    }
+}
+
+
+class KeywordMatcher:
+    """
+    关键词匹配器
+
+    所有关键词编译为一个前瞻正则，一次扫描定位可能命中的起始位置，
+    再在该位置按首字符分桶逐个确认，因此互相重叠的关键词也都能找到。
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords if keyword))
+        self._order = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self._by_first: Dict[str, List[str]] = {}
+        for keyword in self.keywords:
+            self._by_first.setdefault(keyword[0], []).append(keyword)
+        alternation = '|'.join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=(?:{alternation}))') if self.keywords else None
+
+    def find(self, text: str) -> List[Tuple[str, int]]:
+        """返回全部命中的 (关键词, 位置)，按位置排序"""
+        if self._pattern is None:
+            return []
+        hits = []
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for keyword in self._by_first[text[start]]:
+                if text.startswith(keyword, start):
+                    hits.append((keyword, start))
+        return hits
+
+    def matches(self, text: str) -> List[str]:
+        """返回命中的关键词（去重，按配置中的顺序）"""
+        return self.ordered(self.find(text))
+
+    def ordered(self, hits: List[Tuple[str, int]]) -> List[str]:
+        """把 find 的结果整理为去重、按配置顺序排列的关键词"""
+        return sorted({keyword for keyword, _ in hits}, key=self._order.get)
+
+
+class DetectionRules:
+    """
+    一个版本的检测规则（加载后不再修改）
+
+    包含紧急/警告关键词、情绪增强因子、关切点关键词和情绪到内容的映射，
+    以及由关键词编译出的匹配器。
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.version: str = data['version']
+        self.urgent_keywords: List[str] = list(data['urgent_keywords'])
+        self.warning_keywords: List[str] = list(data['warning_keywords'])
+        self.emotion_enhancers: Dict[str, float] = {k: float(v) for k, v in data['emotion_enhancers'].items()}
+        self.concern_keywords: Dict[str, List[str]] = {k: list(v) for k, v in data['concern_keywords'].items()}
+        self.emotion_weights: Dict[str, List[str]] = {k: list(v) for k, v in data['emotion_weights'].items()}
+
+        self.urgent_matcher = KeywordMatcher(self.urgent_keywords)
+        self.warning_matcher = KeywordMatcher(self.warning_keywords)
+        self.concern_matcher = KeywordMatcher([k for words in self.concern_keywords.values() for k in words])
+        self._concern_types: Dict[str, List[str]] = {}
+        for concern_type, words in self.concern_keywords.items():
+            for word in words:
+                self._concern_types.setdefault(word.lower(), []).append(concern_type)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "DetectionRules":
+        """校验并编译规则，不合法时抛出ValueError"""
+        if not isinstance(data, dict):
+            raise ValueError("检测配置必须是JSON对象")
+        if not isinstance(data.get('version'), str) or not data['version'].strip():
+            raise ValueError("version 必须是非空字符串")
+        for key in ('urgent_keywords', 'warning_keywords'):
+            if not _is_str_list(data.get(key)) or not data[key]:
+                raise ValueError(f"{key} 必须是非空的字符串列表")
+        enhancers = data.get('emotion_enhancers')
+        if not isinstance(enhancers, dict) or not all(
+                isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in enhancers.values()):
+            raise ValueError("emotion_enhancers 必须是 情绪 -> 正数 的映射")
+        for key in ('concern_keywords', 'emotion_weights'):
+            mapping = data.get(key)
+            if not isinstance(mapping, dict) or not all(_is_str_list(v) for v in mapping.values()):
+                raise ValueError(f"{key} 必须是 名称 -> 字符串列表 的映射")
+
+        rules = cls(data)
+        rules._run_self_tests(data.get('tests', []))
+        return rules
+
+    def find_concerns(self, text: str) -> List[str]:
+        """返回文本命中的关切点类型（按配置中的顺序）"""
+        return self.concerns_from_hits(self.concern_matcher.find(text))
+
+    def concerns_from_hits(self, hits: List[Tuple[str, int]]) -> List[str]:
+        """由关切点关键词的命中结果得到关切点类型（按配置中的顺序）"""
+        found = set()
+        for keyword, _ in hits:
+            found.update(self._concern_types[keyword])
+        return [concern_type for concern_type in self.concern_keywords if concern_type in found]
+
+    def keyword_level(self, text: str) -> str:
+        """仅按关键词判断的级别：urgent / warning / normal"""
+        if self.urgent_matcher.find(text):
+            return 'urgent'
+        if self.warning_matcher.find(text):
+            return 'warning'
+        return 'normal'
+
+    def _run_self_tests(self, tests: Any):
+        """执行配置自带的用例（{"text": ..., "level": ...}），任一失败则拒绝该版本"""
+        if not isinstance(tests, list):
+            raise ValueError("tests 必须是列表")
+        for test in tests:
+            if not isinstance(test, dict) or not isinstance(test.get('text'), str):
+                raise ValueError(f"无效的测试用例: {test}")
+            level = self.keyword_level(test['text'].lower())
+            if level != test.get('level'):
+                raise ValueError(f"测试用例未通过: {test['text']!r} 期望 {test.get('level')}，实际 {level}")
+
+
+def _is_str_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(v, str) and v.strip() for v in value)
+
+
+class DetectionConfigManager:
+    """
+    检测规则的热加载
+
+    规则从版本化的JSON配置文件加载，在调用线程（文件监视线程或管理接口）中校验、编译，
+    通过后一次性替换当前规则的引用；检测方每次读取 current 拿到完整的一版规则，
+    加载过程不阻塞检测。校验失败时继续使用当前版本，也可回滚到上一个版本。
+    """
+
+    def __init__(self, path: str, watch_interval: float = 0):
+        self.path = path
+        self._rules = DetectionRules.from_dict(DEFAULT_RULES)
+        self._previous: Optional[DetectionRules] = None
+        self._listeners: List[Callable[[DetectionRules, DetectionRules], None]] = []
+        self._lock = threading.Lock()
+        self.loaded_at = time.time()
+        self.last_error: Optional[str] = None
+        if os.path.exists(path):
+            self.load()
+        else:
+            logger.info(f"检测配置文件不存在，使用内置规则: {path}")
+        self._watcher = None
+        if watch_interval > 0:
+            self._watcher = FileWatcher(path, self.load, watch_interval, name="detection-config-watcher")
+            self._watcher.start()
+
+    @property
+    def current(self) -> DetectionRules:
+        """当前生效的规则"""
+        return self._rules
+
+    @property
+    def version(self) -> str:
+        return self._rules.version
+
+    def subscribe(self, listener: Callable[[DetectionRules, DetectionRules], None]):
+        """注册规则切换后的回调 listener(旧规则, 新规则)，在加载线程中执行"""
+        self._listeners.append(listener)
+
+    def load(self) -> bool:
+        """从文件加载新版本；版本号未变化或校验失败时保留当前版本"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rules = DetectionRules.from_dict(json.load(f))
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"加载检测配置失败，继续使用版本 {self.version}: {e}")
+            return False
+        if rules.version == self.version:
+            logger.info(f"检测配置版本未变化: {rules.version}")
+            return False
+        self._publish(rules)
+        return True
+
+    def rollback(self) -> bool:
+        """回滚到上一个版本"""
+        if self._previous is None:
+            return False
+        self._publish(self._previous)
+        return True
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "previous_version": self._previous.version if self._previous else None,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error
+        }
+
+    def _publish(self, rules: DetectionRules):
+        with self._lock:
+            old = self._rules
+            self._previous, self._rules = old, rules
+            self.loaded_at = time.time()
+            self.last_error = None
+        logger.info(f"检测配置已切换: {old.version} -> {rules.version}")
+        for listener in list(self._listeners):
+            try:
+                listener(old, rules)
+            except Exception as e:
+                logger.error(f"检测配置切换回调失败: {e}")
+
+
+# 全局实例
+detection_config = DetectionConfigManager(config.DETECTION_CONFIG_FILE, config.DETECTION_CONFIG_WATCH_INTERVAL)
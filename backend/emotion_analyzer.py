@@ -2,6 +2,7 @@ import logging
 from typing import Optional, Dict, Tuple
 from openai import OpenAI
 from config import config
+from llm_scheduler import llm_scheduler, INTERACTIVE
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +47,8 @@ class EmotionAnalyzer:
         文本："{}"
         情绪标签："""
         
-        response = self.client.chat.completions.create(
+        response = llm_scheduler.create(
+            self.client, INTERACTIVE,
             model=self.model,
             messages=[
                 {"role": "system", "content": "只返回情绪标签"},
@@ -86,7 +88,8 @@ class EmotionAnalyzer:
         深层情绪：[你的选择]
         解释：[简要解释]"""
         
-        response = self.client.chat.completions.create(
+        response = llm_scheduler.create(
+            self.client, INTERACTIVE,
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
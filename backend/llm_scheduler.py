@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import config
+
+# 请求类别，按优先级从高到低
+CRISIS = 'crisis'            # 危机干预回应
+INTERACTIVE = 'interactive'  # 普通对话回复、情绪分析、风险复核
+BACKGROUND = 'background'    # 内容推荐等后台任务
+
+PRIORITIES = (CRISIS, INTERACTIVE, BACKGROUND)
+
+
+class LLMScheduler:
+    """
+    LLM请求的优先级调度
+
+    所有类别共享总并发上限，每个类别另有并发配额。
+    有空位时总是先放行优先级最高、且未超配额的类别中最早排队的请求。
+    非危机类别的配额之和必须小于总并发上限，对话和后台任务都排满时危机请求仍有空位；
+    后台任务的配额较小，排满时也给对话请求留出空位。
+    按类别记录并发数、排队深度和等待时间。
+    """
+
+    def __init__(self, max_concurrency: int, quotas: Dict[str, int], queue_timeout: Optional[float] = None):
+        reserved = max_concurrency - quotas[INTERACTIVE] - quotas[BACKGROUND]
+        if reserved < 1:
+            raise ValueError(
+                f"LLM并发配额无效：对话({quotas[INTERACTIVE]}) + 后台({quotas[BACKGROUND]}) "
+                f"必须小于总并发上限({max_concurrency})，为危机回应留出空位"
+            )
+        self.max_concurrency = max_concurrency
+        self.quotas = quotas
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting: Dict[str, deque] = {name: deque() for name in PRIORITIES}
+        self._active: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._total_active = 0
+        self._stats: Dict[str, Dict[str, float]] = {
+            name: {'completed': 0, 'timed_out': 0, 'wait_seconds': 0.0, 'max_waiting': 0}
+            for name in PRIORITIES
+        }
+
+    def create(self, client: Any, priority: str, **kwargs) -> Any:
+        """按优先级排队后调用 client.chat.completions.create"""
+        with self.slot(priority):
+            return client.chat.completions.create(**kwargs)
+
+    @contextmanager
+    def slot(self, priority: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """占用一个并发位置；排队超时抛出 TimeoutError"""
+        self._acquire(priority, self.queue_timeout if timeout is None else timeout)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def info(self) -> Dict[str, Any]:
+        """各类别的并发数、排队深度和等待统计"""
+        with self._cond:
+            classes = {}
+            for name in PRIORITIES:
+                stats = self._stats[name]
+                classes[name] = {
+                    'active': self._active[name],
+                    'queued': len(self._waiting[name]),
+                    'quota': self.quotas[name],
+                    'max_queued': stats['max_waiting'],
+                    'completed': stats['completed'],
+                    'timed_out': stats['timed_out'],
+                    'avg_wait_ms': round(stats['wait_seconds'] * 1000 / max(stats['completed'], 1), 1)
+                }
+            return {
+                'max_concurrency': self.max_concurrency,
+                'active': self._total_active,
+                'classes': classes
+            }
+
+    def _acquire(self, priority: str, timeout: Optional[float]):
+        ticket = object()
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            waiting = self._waiting[priority]
+            waiting.append(ticket)
+            stats = self._stats[priority]
+            stats['max_waiting'] = max(stats['max_waiting'], len(waiting))
+            while not self._can_start(priority, ticket):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    waiting.remove(ticket)
+                    stats['timed_out'] += 1
+                    # 队首离开后，后面的请求可能可以开始
+                    self._cond.notify_all()
+                    raise TimeoutError(f"LLM请求排队超时（{priority}）")
+                self._cond.wait(remaining)
+            waiting.popleft()
+            self._active[priority] += 1
+            self._total_active += 1
+            stats['wait_seconds'] += time.monotonic() - start
+            # 同类别的下一个请求可能也能开始
+            self._cond.notify_all()
+
+    def _release(self, priority: str):
+        with self._cond:
+            self._active[priority] -= 1
+            self._total_active -= 1
+            self._stats[priority]['completed'] += 1
+            self._cond.notify_all()
+
+    def _can_start(self, priority: str, ticket: object) -> bool:
+        if self._waiting[priority][0] is not ticket:
+            return False
+        if self._total_active >= self.max_concurrency or self._active[priority] >= self.quotas[priority]:
+            return False
+        # 更高优先级的类别有请求在等且未超配额时先让它们开始
+        for higher in PRIORITIES[:PRIORITIES.index(priority)]:
+            if self._waiting[higher] and self._active[higher] < self.quotas[higher]:
+                return False
+        return True
+
+
+# 全局实例
+llm_scheduler = LLMScheduler(
+    config.LLM_MAX_CONCURRENCY,
+    {
+        CRISIS: config.LLM_QUOTA_CRISIS,
+        INTERACTIVE: config.LLM_QUOTA_INTERACTIVE,
+        BACKGROUND: config.LLM_QUOTA_BACKGROUND
+    },
+    config.LLM_QUEUE_TIMEOUT
+)
@@ -5,6 +5,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api_endpoints import router
+from asset_files import mount_assets
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +31,9 @@ app.add_middleware(
 # 注册所有路由
 app.include_router(router)
 
+# 内容资源文件（/audios、/tools 等，支持Range和条件请求）
+mount_assets(app)
+
 # ------------------ 启动入口 ------------------
 if __name__ == "__main__":
     print("\n" + "="*60)
@@ -50,6 +50,7 @@ class RecommendationResponse(BaseModel):
     recommendations: List[ContentItem]
     rationale: str  # 推荐理由
     match_score: Dict[str, float]  # 匹配度分数
+    strategy: Optional[str] = None  # 推荐策略：ai_rerank / rule_based / default
 
 class ChatResponse(BaseModel):
     response: str
@@ -57,3 +58,4 @@ class ChatResponse(BaseModel):
     urgent_issue: Optional[Dict[str, Any]] = None # 紧急问题识别结果
     recommendations: Optional[List[ContentItem]] = None  # 新增：推荐内容
     recommendation_rationale: Optional[str] = None  # 新增：推荐理由
+    recommendations_pending: bool = False  # 推荐在后台生成中，通过 /session/{user_id}/{session_id}/recommendations 获取
@@ -0,0 +1,81 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class RecommendationCache:
+    """
+    推荐结果缓存
+
+    以 (用户文本摘要, 情绪, 对话阶段, 关切点, 数量, 内容类型) 为键的有界LRU缓存，条目带TTL。
+    关键词召回、语义召回和AI重排都取决于用户文本，文本按小写和合并空白归一化后取摘要。
+    每个条目记录生成时的目录版本，目录变化（添加、重新加载、热门榜变动）后旧条目自动失效。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user_input: str, current_emotion: str, conversation_summary: Dict[str, Any], limit: int,
+                 content_types: Optional[List[str]] = None) -> Hashable:
+        """构建缓存键"""
+        normalized = ' '.join(user_input.lower().split())
+        return (
+            hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest(),
+            current_emotion,
+            conversation_summary.get('conversation_stage', 'initial'),
+            tuple(sorted(conversation_summary.get('key_concerns', []))),
+            limit,
+            tuple(sorted(content_types or []))
+        )
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        """读取未过期且目录版本一致的结果"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, version: Hashable, value: Any):
+        """写入结果；生成期间目录已变化的结果直接丢弃"""
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic(), version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        """缓存状态"""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _check_version(self, version: Hashable):
+        # 只在看到更新的版本时清空；落后的版本（慢请求的结果）不会回退缓存
+        if self._version is None or (version != self._version and version > self._version):
+            self._entries.clear()
+            self._version = version
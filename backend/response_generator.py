@@ -2,6 +2,7 @@ import logging
 from typing import Dict, Optional
 from openai import OpenAI
 from config import config
+from llm_scheduler import llm_scheduler, INTERACTIVE
 
 logger = logging.getLogger(__name__)
 
@@ -84,7 +85,8 @@ class ResponseGenerator:
         )
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_scheduler.create(
+                self.client, INTERACTIVE,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -0,0 +1,93 @@
+import re
+from functools import cached_property
+from typing import List, Optional, Tuple, Union
+
+from content_vectors import tokenize
+from detection_config import DetectionRules, KeywordMatcher, detection_config
+
+_CHINESE_WORD = re.compile(r'[\u4e00-\u9fa5]{2,}')
+
+# 心理相关关键词（推荐时补充到连续中文片段之外）
+PSYCH_KEYWORDS = [
+    "压力", "焦虑", "抑郁", "情绪", "学习", "考试", "工作",
+    "关系", "朋友", "家人", "未来", "迷茫", "自我", "自信",
+    "睡眠", "饮食", "运动", "放松", "冥想", "正念"
+]
+_PSYCH_MATCHER = KeywordMatcher(PSYCH_KEYWORDS)
+
+
+class AnalyzedText:
+    """
+    一次请求中用户文本的分析结果
+
+    在请求入口创建一次，紧急检测、关切点提取、推荐的关键词与语义检索共用，
+    各项结果在首次使用时计算并缓存，同一文本不会被重复归一化和扫描。
+    创建时固定当前版本的检测规则，同一请求内各模块看到的规则一致。
+    """
+
+    def __init__(self, text: str, rules: Optional[DetectionRules] = None):
+        self.text = text
+        self.normalized = text.lower()
+        self.rules = rules or detection_config.current
+
+    @classmethod
+    def of(cls, value: Union[str, "AnalyzedText"]) -> "AnalyzedText":
+        """已是分析结果时直接返回，否则分析该文本"""
+        return value if isinstance(value, AnalyzedText) else cls(value)
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    # ---------- 关键词命中 (关键词, 位置) ----------
+
+    @cached_property
+    def urgent_hits(self) -> List[Tuple[str, int]]:
+        return self.rules.urgent_matcher.find(self.normalized)
+
+    @cached_property
+    def warning_hits(self) -> List[Tuple[str, int]]:
+        return self.rules.warning_matcher.find(self.normalized)
+
+    @cached_property
+    def concern_hits(self) -> List[Tuple[str, int]]:
+        return self.rules.concern_matcher.find(self.normalized)
+
+    @cached_property
+    def psych_hits(self) -> List[Tuple[str, int]]:
+        return _PSYCH_MATCHER.find(self.normalized)
+
+    # ---------- 切分 ----------
+
+    @cached_property
+    def chinese_spans(self) -> List[Tuple[str, int]]:
+        """连续中文片段 (片段, 位置)，两个字以上"""
+        return [(match.group(), match.start()) for match in _CHINESE_WORD.finditer(self.normalized)]
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        """检索特征：中文字的一元和二元组，英文/数字按词（与内容向量索引一致）"""
+        return tokenize(self.normalized)
+
+    # ---------- 各模块使用的结果 ----------
+
+    @cached_property
+    def urgent_keywords(self) -> List[str]:
+        return self.rules.urgent_matcher.ordered(self.urgent_hits)
+
+    @cached_property
+    def warning_keywords(self) -> List[str]:
+        return self.rules.warning_matcher.ordered(self.warning_hits)
+
+    @cached_property
+    def concerns(self) -> List[str]:
+        """命中的关切点类型"""
+        return self.rules.concerns_from_hits(self.concern_hits)
+
+    @cached_property
+    def keywords(self) -> List[str]:
+        """推荐用关键词：连续中文片段，加上未包含在内的心理相关关键词"""
+        keywords = list(dict.fromkeys(span for span, _ in self.chinese_spans))
+        for keyword in _PSYCH_MATCHER.ordered(self.psych_hits):
+            if keyword not in keywords:
+                keywords.append(keyword)
+        return keywords
@@ -1,16 +1,44 @@
 # urgent_detector.py - 模块化版本
 import os
+import re
+import gzip
 import json
+import math
+import queue
+import atexit
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, Iterator, List, Any, Optional, Union
 from openai import OpenAI
 from config import config  # 从配置导入
+from detection_config import detection_config
+from text_analysis import AnalyzedText
+from llm_scheduler import llm_scheduler, CRISIS, INTERACTIVE
+from urgent_store import UrgentCaseIndex, UrgentDayStats
+from utils import encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 
 class UrgentDetector:
-    """紧急情况检测器"""
+    """
+    紧急情况检测器
+
+    除单条消息的关键词评估外，按会话维护累积风险：每轮把本条消息的风险分
+    加到按时间指数衰减后的累积值上（O(1)，不回溯历史），
+    累积值达到阈值时把本轮的 warning 升级为 warning_high。
+    
+    关键词评估在请求路径上即时给出结论；warning 级别和边缘消息（无关键词但
+    累积风险较高）另在后台线程交给LLM复核，LLM判定更高时通过回调上报升级。
+    """
+    
+    LEVEL_RANK = {'normal': 0, 'warning': 1, 'warning_high': 2, 'urgent': 3}
+    
+    MAX_TRACKED_SESSIONS = 10000  # 累积风险最多跟踪的会话数，超出时淘汰最久未更新的
+    NEGATIVE_EMOTION_RISK = 0.5  # 无关键词时负面情绪每轮的基础风险（再乘情绪增强因子）
     
     def __init__(self):
         self.client = OpenAI(
@@ -19,62 +47,219 @@ class UrgentDetector:
         )
         self.model = config.CHAT_MODEL
         
-        # 紧急关键词 - 需要立即干预
-        self.urgent_keywords = [
-            '自杀', '不想活了', '结束生命', '绝望', '活够了',
-            '想死', '死掉', '离开世界', '生命没意义', '自我了断',
-            '跳楼', '割腕', '服毒', '上吊', '烧炭', '安乐死'
-        ]
-        
-        # 警告关键词 - 需要密切关注
-        self.warning_keywords = [
-            '活不下去', '没意思', '太痛苦', '撑不住', '崩溃',
-            '想消失', '人间不值得', '好累', '绝望', '无助',
-            '没人理解', '孤独', '被抛弃', '没有希望', '想放弃'
-        ]
-        
-        # 情绪增强因子
-        self.emotion_enhancers = {
-            '抑郁': 2.0,
-            '焦虑': 1.5,
-            '愤怒': 1.2,
-            '压力': 1.3
-        }
+        # 紧急/警告关键词和情绪增强因子来自可热加载的检测配置（见 detection_config）
+        
+        # 会话累积风险：会话键 -> (累积值, 更新时间)
+        self.risk_half_life = config.URGENT_RISK_HALF_LIFE
+        self.cumulative_high = config.URGENT_CUMULATIVE_HIGH
+        self._session_risk: "OrderedDict[str, tuple]" = OrderedDict()
+        self._risk_lock = threading.Lock()
+        
+        # LLM异步复核
+        self.confirm_enabled = config.URGENT_CONFIRM_ENABLED
+        self.confirm_timeout = config.URGENT_CONFIRM_TIMEOUT
+        self.confirm_min_risk = config.URGENT_CONFIRM_MIN_RISK
+        self._confirm_executor = ThreadPoolExecutor(
+            max_workers=config.URGENT_CONFIRM_WORKERS, thread_name_prefix="urgent-confirm"
+        )
+        # 执行中和排队中的复核总数上限，负载高时不积压
+        self._confirm_slots = threading.BoundedSemaphore(
+            config.URGENT_CONFIRM_WORKERS + config.URGENT_CONFIRM_QUEUE_SIZE
+        )
     
-    def detect(self, text: str, emotion: str) -> Dict[str, Any]:
+    def detect(self, text: Union[str, AnalyzedText], emotion: str, session_key: Optional[str] = None,
+               record: bool = True) -> Dict[str, Any]:
         """
         检测用户输入中的紧急情况
+        
+        text 可以是请求入口已创建的 AnalyzedText，复用其中的关键词扫描结果。
+        指定 session_key 时结合会话累积风险；record=False 时只计算不更新累积值
+        （如单独的情绪分析请求，避免与对话请求重复计入）。
         返回: {
-            'level': 'normal'/'warning'/'urgent',
+            'level': 'normal'/'warning'/'warning_high'/'urgent',
             'message': str,
             'suggestions': List[str],
             'triggers': List[str],
-            'risk_score': float
+            'risk_score': float,
+            'cumulative_risk': float  # 指定 session_key 时
         }
         """
-        text_lower = text.lower()
+        # 整个检测过程使用分析文本时固定的同一版规则
+        analysis = AnalyzedText.of(text)
+        found_urgent = analysis.urgent_keywords
+        found_warning = analysis.warning_keywords
+        
+        enhancers = analysis.rules.emotion_enhancers
+        
+        result = self._evaluate_urgency_level(found_urgent, found_warning, emotion, enhancers)
+        if session_key is not None:
+            self._apply_cumulative_risk(result, emotion, session_key, record, enhancers)
+        return result
+    
+    def needs_confirmation(self, urgent_issue: Dict[str, Any]) -> bool:
+        """是否需要LLM复核：warning 级别，或无关键词但会话累积风险较高的边缘消息"""
+        if not self.confirm_enabled:
+            return False
+        if urgent_issue['level'] in ('warning', 'warning_high'):
+            return True
+        return urgent_issue['level'] == 'normal' and \
+            urgent_issue.get('cumulative_risk', 0.0) >= self.confirm_min_risk
+    
+    def schedule_confirmation(self, text: str, emotion: str, urgent_issue: Dict[str, Any],
+                              on_upgrade: Callable[[Dict[str, Any]], None],
+                              session_key: Optional[str] = None) -> bool:
+        """
+        需要时提交LLM复核（不阻塞调用方），返回是否已提交
+        
+        LLM判定的级别高于本地结果时，以升级后的 urgent_issue 调用 on_upgrade（在复核线程中执行）。
+        复核队列已满时丢弃本次复核并记录日志，本地检测结果照常生效。
+        """
+        if not self.needs_confirmation(urgent_issue):
+            return False
+        if not self._confirm_slots.acquire(blocking=False):
+            logger.warning(f"LLM复核队列已满，跳过本次复核: 级别={urgent_issue['level']}, 会话={session_key}")
+            return False
+        try:
+            future = self._confirm_executor.submit(
+                self._confirm_task, text, emotion, dict(urgent_issue), on_upgrade, session_key
+            )
+        except Exception:
+            self._confirm_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._confirm_slots.release())
+        return True
+    
+    def _confirm_task(self, text: str, emotion: str, urgent_issue: Dict[str, Any],
+                      on_upgrade: Callable[[Dict[str, Any]], None], session_key: Optional[str]):
+        """LLM复核任务"""
+        classified = self._classify_risk(text, emotion)
+        if classified is None:
+            return
+        level, reason = classified
+        if self.LEVEL_RANK[level] <= self.LEVEL_RANK[urgent_issue['level']]:
+            return
+        
+        triggers = urgent_issue['triggers']
+        if level == 'urgent':
+            upgraded = self._create_urgent_response(triggers)
+        else:
+            upgraded = self._create_warning_response(triggers, emotion, detection_config.current.emotion_enhancers)
+            upgraded.update({
+                'level': level,
+                'message': '检测到较高风险，建议尽快寻求帮助' if level == 'warning_high' else upgraded['message'],
+                'risk_score': max(upgraded['risk_score'], 6.0 if level == 'warning_high' else 2.0)
+            })
+        upgraded.update({
+            'previous_level': urgent_issue['level'],
+            'confirmed_by': 'llm',
+            'llm_reason': reason
+        })
+        if session_key is not None:
+            upgraded['cumulative_risk'] = round(
+                self._add_session_risk(session_key, upgraded['risk_score'] - urgent_issue['risk_score']), 2
+            )
+        
+        logger.warning(f"LLM复核升级紧急级别: {urgent_issue['level']} -> {level}, 原因: {reason}")
+        try:
+            on_upgrade(upgraded)
+        except Exception as e:
+            logger.error(f"处理紧急级别升级失败: {e}")
+    
+    def _classify_risk(self, text: str, emotion: str) -> Optional[tuple]:
+        """LLM风险分级，返回 (级别, 理由)；失败或超时返回 None"""
+        prompt = f"""请评估以下学生消息的心理危机风险。
         
-        found_urgent = self._find_keywords(text_lower, self.urgent_keywords)
-        found_warning = self._find_keywords(text_lower, self.warning_keywords)
+        消息："{text}"
+        识别到的情绪：{emotion}
         
-        return self._evaluate_urgency_level(found_urgent, found_warning, emotion)
+        级别定义：
+        - normal: 无明显风险
+        - warning: 有消极情绪或轻度风险信号，需要关注
+        - warning_high: 有较明确的绝望、自伤倾向等信号，需要尽快干预
+        - urgent: 表达了自杀、自伤意图或计划，需要立即干预
+        
+        注意识别隐晦、换一种说法的表达。只返回JSON：{{"level": "...", "reason": "不超过30字"}}"""
+        
+        try:
+            response = llm_scheduler.create(
+                self.client, INTERACTIVE,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "你是一位心理危机风险评估专家。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.0,
+                max_tokens=100,
+                response_format={"type": "json_object"},
+                timeout=self.confirm_timeout
+            )
+            data = json.loads(response.choices[0].message.content.strip())
+        except Exception as e:
+            logger.error(f"LLM风险复核失败: {e}")
+            return None
+        
+        level = data.get('level') if isinstance(data, dict) else None
+        if level not in self.LEVEL_RANK:
+            logger.warning(f"LLM风险复核返回无效级别: {data}")
+            return None
+        return level, str(data.get('reason', ''))[:100]
+    
+    def reset_session(self, session_key: str):
+        """清除会话的累积风险"""
+        with self._risk_lock:
+            self._session_risk.pop(session_key, None)
     
-    def _find_keywords(self, text: str, keywords: List[str]) -> List[str]:
-        """查找关键词"""
-        found = []
-        for keyword in keywords:
-            if keyword in text:
-                found.append(keyword)
-        return found
+    def _add_session_risk(self, session_key: str, delta: float) -> float:
+        """给会话累积风险追加风险分（先按时间衰减），返回新的累积值"""
+        now = time.time()
+        with self._risk_lock:
+            previous, updated_at = self._session_risk.get(session_key, (0.0, now))
+            decay = math.pow(0.5, max(now - updated_at, 0.0) / self.risk_half_life)
+            cumulative = previous * decay + delta
+            self._session_risk[session_key] = (cumulative, now)
+            self._session_risk.move_to_end(session_key)
+            if len(self._session_risk) > self.MAX_TRACKED_SESSIONS:
+                self._session_risk.popitem(last=False)
+        return cumulative
+    
+    def _apply_cumulative_risk(self, result: Dict[str, Any], emotion: str,
+                               session_key: str, record: bool, enhancers: Dict[str, float]):
+        """更新会话累积风险，达到阈值时升级本轮的 warning"""
+        turn_risk = result['risk_score']
+        if not result['triggers'] and emotion in enhancers:
+            turn_risk = self.NEGATIVE_EMOTION_RISK * enhancers[emotion]
+        
+        if record:
+            cumulative = self._add_session_risk(session_key, turn_risk)
+        else:
+            now = time.time()
+            with self._risk_lock:
+                previous, updated_at = self._session_risk.get(session_key, (0.0, now))
+            cumulative = previous * math.pow(0.5, max(now - updated_at, 0.0) / self.risk_half_life) + turn_risk
+        
+        result['cumulative_risk'] = round(cumulative, 2)
+        if result['level'] == 'warning' and cumulative >= self.cumulative_high:
+            result.update({
+                'level': 'warning_high',
+                'message': '多轮对话中持续出现风险信号，建议尽快寻求帮助',
+                'suggestions': [
+                    '建议联系学校心理咨询师',
+                    '可以拨打心理援助热线',
+                    '与信任的人谈谈你的感受',
+                    '尝试一些放松技巧（深呼吸、冥想）'
+                ],
+                'escalated_by': 'cumulative_risk'
+            })
     
     def _evaluate_urgency_level(self, urgent_keywords: List[str], 
-                               warning_keywords: List[str], emotion: str) -> Dict[str, Any]:
-        """评估紧急级别"""
+                               warning_keywords: List[str], emotion: str,
+                               enhancers: Dict[str, float]) -> Dict[str, Any]:
+        """评估紧急级别（enhancers 为本次检测固定的那一版规则中的情绪增强因子）"""
         if urgent_keywords:
             return self._create_urgent_response(urgent_keywords)
         
         elif warning_keywords:
-            return self._create_warning_response(warning_keywords, emotion)
+            return self._create_warning_response(warning_keywords, emotion, enhancers)
         
         else:
             return self._create_normal_response()
@@ -99,13 +284,14 @@ class UrgentDetector:
             'risk_score': 10.0
         }
     
-    def _create_warning_response(self, triggers: List[str], emotion: str) -> Dict[str, Any]:
+    def _create_warning_response(self, triggers: List[str], emotion: str,
+                                 enhancers: Dict[str, float]) -> Dict[str, Any]:
         """创建警告响应"""
         severity = len(triggers)
         
         # 考虑情绪增强因子
-        if emotion in self.emotion_enhancers:
-            severity *= self.emotion_enhancers[emotion]
+        if emotion in enhancers:
+            severity *= enhancers[emotion]
         
         risk_score = min(severity * 2.0, 9.9)  # 风险评分0-9.9
         
@@ -176,7 +362,8 @@ class UrgentDetector:
         现在生成回应："""
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_scheduler.create(
+                self.client, CRISIS,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "你是一位心理危机干预助手，正在处理紧急情况。"},
@@ -210,7 +397,8 @@ class UrgentDetector:
         现在生成回应："""
         
         try:
-            response = self.client.chat.completions.create(
+            response = llm_scheduler.create(
+                self.client, CRISIS,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "你是一位细心倾听的心理支持伙伴。"},
@@ -241,29 +429,101 @@ class UrgentDetector:
 
 
 class UrgentLogger:
-    """紧急情况日志记录器"""
+    """
+    紧急情况日志记录器
+
+    日志按天写入 urgent_cases_YYYYMMDD.jsonl，每行一条记录，只追加不重写。
+    请求线程只把记录放入内存队列，由单个后台写线程批量取出、追加写入，
+    每批 fsync 一次；写线程是文件的唯一写入者，并发请求不会互相覆盖。
+    读取时兼容旧版整体写入的 urgent_cases_YYYYMMDD.json。
+    后台轮转线程把已结束的日期合并压缩为 urgent_cases_YYYYMMDD.jsonl.gz。
+    查询走内存索引（首次查询时从最近 index_days 天的日志重建，之后随记录增量更新，
+    日期变化后丢弃移出窗口的记录），更早的时间范围流式读取日志文件，凑够一页即停止。
+    每天另有聚合统计 urgent_stats_YYYYMMDD.json，由写线程在每批写入后更新，
+    多日统计只需合并各日聚合。
+    """
+    
+    LOG_FILE_PATTERN = re.compile(r'^urgent_cases_(\d{8})\.(?:json|jsonl|jsonl\.gz)$')
+    BATCH_SIZE = 256  # 每批最多写入的记录数
+    WRITE_RETRIES = 3
     
-    def __init__(self, log_dir: str = "logs"):
+    _STOP = object()
+    
+    def __init__(self, log_dir: str = "logs", index_days: int = config.URGENT_INDEX_DAYS,
+                 rotate_interval: float = config.URGENT_LOG_ROTATE_INTERVAL):
         self.log_dir = log_dir
+        self.index_days = index_days
+        self.rotate_interval = rotate_interval
         os.makedirs(log_dir, exist_ok=True)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._index: Optional[UrgentCaseIndex] = None
+        self._index_since = ''
+        self._index_lock = threading.Lock()
+        self._day_stats: Dict[str, UrgentDayStats] = {}
+        self._stats_lock = threading.Lock()
+        # 写线程追加与轮转线程压缩同一天的文件时互斥
+        self._file_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._ensure_writer()
+        self._rotator = threading.Thread(target=self._rotate_loop, name="urgent-log-rotator", daemon=True)
+        self._rotator.start()
+        atexit.register(self.close)
     
     def log_interaction(self, interaction_data: Dict):
-        """记录紧急交互到文件"""
-        log_entry = self._create_log_entry(interaction_data)
-        
-        log_file = f"{self.log_dir}/urgent_cases_{datetime.now().strftime('%Y%m%d')}.json"
-        
+        """记录紧急交互（放入写队列，由后台线程落盘）"""
         try:
-            logs = self._load_existing_logs(log_file)
-            logs.append(log_entry)
-            self._save_logs(log_file, logs)
-            logger.info(f"紧急情况已记录: {log_file}")
+            log_entry = self._create_log_entry(interaction_data)
         except Exception as e:
             logger.error(f"记录紧急情况失败: {e}")
+            return
+        if self._stop.is_set():
+            # 已关闭（进程退出过程中）：写线程不再运行，直接同步写入
+            self._write_batch([log_entry])
+            return
+        self._ensure_writer()
+        with self._index_lock:
+            # 索引尚未建立时不必添加，建立索引时会从日志读到这条记录
+            if self._index is not None:
+                self._trim_index()
+                self._index.add(log_entry)
+            self._queue.put(log_entry)
+        logger.info(f"紧急情况已加入写队列: {log_entry['urgent_level']}, 会话: {log_entry['session_id']}")
+    
+    def _ensure_writer(self):
+        """写线程未运行（首次启动或意外退出）时启动，积压在队列中的记录会由新线程写入"""
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            if self._writer is not None:
+                logger.error("紧急情况写线程已退出，重新启动")
+            self._writer = threading.Thread(target=self._writer_loop, name="urgent-log-writer", daemon=True)
+            self._writer.start()
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中已有的记录全部落盘，超时返回 False"""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._writer.is_alive():
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def close(self, timeout: float = 5.0):
+        """写完队列中剩余的记录后停止写线程和轮转线程"""
+        self._stop.set()
+        if self._writer.is_alive():
+            self._queue.put(self._STOP)
+            self._writer.join(timeout)
     
     def _create_log_entry(self, interaction_data: Dict) -> Dict:
         """创建日志条目"""
-        return {
+        entry = {
             'timestamp': datetime.now().isoformat(),
             'user_id': interaction_data['user_id'],
             'session_id': interaction_data['session_id'],
@@ -274,60 +534,396 @@ class UrgentLogger:
             'emotion': interaction_data['emotion'],
             'ai_response_preview': interaction_data['ai_response'][:100]
         }
+        # LLM复核升级的记录标明原级别
+        if interaction_data['urgent_issue'].get('confirmed_by'):
+            entry['confirmed_by'] = interaction_data['urgent_issue']['confirmed_by']
+            entry['previous_level'] = interaction_data['urgent_issue'].get('previous_level')
+        return entry
     
-    def _load_existing_logs(self, log_file: str) -> List[Dict]:
-        """加载现有日志"""
-        if os.path.exists(log_file):
-            with open(log_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+    def _log_file(self, date_str: str) -> str:
+        return f"{self.log_dir}/urgent_cases_{date_str}.jsonl"
     
-    def _save_logs(self, log_file: str, logs: List[Dict]):
-        """保存日志到文件"""
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+    def _legacy_log_file(self, date_str: str) -> str:
+        return f"{self.log_dir}/urgent_cases_{date_str}.json"
     
-    def get_recent_cases(self, days: int = 1, level: Optional[str] = None) -> Dict:
-        """获取最近的紧急情况记录"""
-        today = datetime.now()
-        cases = []
-        
-        for i in range(days):
-            date_str = (today - timedelta(days=i)).strftime('%Y%m%d')
-            log_file = f"{self.log_dir}/urgent_cases_{date_str}.json"
+    def _compressed_log_file(self, date_str: str) -> str:
+        return f"{self.log_dir}/urgent_cases_{date_str}.jsonl.gz"
+    
+    def _stats_file(self, date_str: str) -> str:
+        return f"{self.log_dir}/urgent_stats_{date_str}.json"
+    
+    def _log_size(self, date_str: str) -> int:
+        """某一天日志文件的总字节数"""
+        size = 0
+        for path in (self._log_file(date_str), self._legacy_log_file(date_str),
+                     self._compressed_log_file(date_str)):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+    
+    def _writer_loop(self):
+        """写线程：阻塞取出一条后，把队列中已积压的记录一并作为一批写入"""
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
             
-            if os.path.exists(log_file):
+            entries = [entry for entry in batch if entry is not self._STOP]
+            try:
+                if entries:
+                    self._write_batch(entries)
+            except Exception as e:
+                # 写线程不能因意外异常退出，否则之后的记录都会积压在队列中无人写入
+                logger.error(f"紧急情况写线程处理失败: {e}，本批 {len(entries)} 条: {entries}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(entries) < len(batch):
+                return
+    
+    def _write_batch(self, entries: List[Dict]):
+        """按日期分组追加写入，每个文件写完后 fsync 一次并更新当天聚合；失败时重试"""
+        by_day: Dict[str, List[Dict]] = {}
+        for entry in entries:
+            by_day.setdefault(entry['timestamp'][:10].replace('-', ''), []).append(entry)
+        
+        for date_str, day_entries in by_day.items():
+            log_file = self._log_file(date_str)
+            data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in day_entries)
+            # 写入前加载当天聚合，保证聚合与写入前的日志一致；聚合出错不影响写入日志
+            try:
+                self._get_day_stats(date_str)
+                stats_ok = True
+            except Exception as e:
+                logger.error(f"加载聚合统计失败 {date_str}: {e}")
+                stats_ok = False
+            for attempt in range(1, self.WRITE_RETRIES + 1):
                 try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        day_cases = json.load(f)
-                    
-                    if level:
-                        day_cases = [c for c in day_cases if c['urgent_level'] == level]
-                    
-                    cases.extend(day_cases)
+                    with self._file_lock, open(log_file, 'a', encoding='utf-8') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    break
                 except Exception as e:
-                    logger.error(f"读取日志文件失败 {log_file}: {e}")
+                    if attempt == self.WRITE_RETRIES:
+                        # 落盘失败时至少把记录留在应用日志中
+                        logger.error(f"写入紧急情况日志失败 {log_file}: {e}，丢失 {len(day_entries)} 条: {data}")
+                        day_entries = []
+                    else:
+                        logger.warning(f"写入紧急情况日志失败 {log_file}（第{attempt}次）: {e}")
+                        time.sleep(0.1 * attempt)
+            if not day_entries:
+                continue
+            if stats_ok:
+                try:
+                    self._update_day_stats(date_str, day_entries)
+                    continue
+                except Exception as e:
+                    logger.error(f"更新聚合统计失败 {date_str}: {e}")
+            # 丢弃内存中的聚合，下次读取时按日志大小判断并从原始记录重建
+            with self._stats_lock:
+                self._day_stats.pop(date_str, None)
+    
+    def _read_day(self, date_str: str) -> List[Dict]:
+        """读取某一天的全部记录"""
+        return list(self._iter_day(date_str))
+    
+    def _iter_day(self, date_str: str) -> Iterator[Dict]:
+        """逐条读取某一天的记录（压缩JSONL、旧版JSON数组、JSONL），大致按时间顺序"""
+        compressed_file = self._compressed_log_file(date_str)
+        if os.path.exists(compressed_file):
+            try:
+                with gzip.open(compressed_file, 'rt', encoding='utf-8') as f:
+                    yield from self._iter_lines(f, compressed_file)
+            except (OSError, EOFError) as e:
+                logger.error(f"读取日志文件失败 {compressed_file}: {e}")
+        
+        legacy_file = self._legacy_log_file(date_str)
+        if os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    cases = json.load(f)
+            except Exception as e:
+                logger.error(f"读取日志文件失败 {legacy_file}: {e}")
+                cases = []
+            yield from cases
         
-        # 按时间倒序排序
-        cases.sort(key=lambda x: x['timestamp'], reverse=True)
+        log_file = self._log_file(date_str)
+        if os.path.exists(log_file):
+            try:
+                with open(log_file, 'r', encoding='utf-8') as f:
+                    yield from self._iter_lines(f, log_file)
+            except OSError as e:
+                logger.error(f"读取日志文件失败 {log_file}: {e}")
+    
+    def _iter_lines(self, f, path: str) -> Iterator[Dict]:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 进程在写入中途退出时，最后一行可能不完整
+                logger.warning(f"跳过无法解析的日志行 {path}:{line_no}")
+    
+    def _rotate_loop(self):
+        """轮转线程：启动时和之后每隔 rotate_interval 秒压缩已结束的日期"""
+        while True:
+            try:
+                self.compress_closed_days()
+            except Exception as e:
+                logger.error(f"压缩紧急情况日志失败: {e}")
+            with self._index_lock:
+                if self._index is not None:
+                    self._trim_index()
+            if self._stop.wait(self.rotate_interval):
+                return
+    
+    def compress_closed_days(self):
+        """把今天之前仍为未压缩格式的日志合并压缩为 .jsonl.gz"""
+        today = datetime.now().strftime('%Y%m%d')
+        for date_str in self._log_dates():
+            if date_str >= today:
+                continue
+            if os.path.exists(self._log_file(date_str)) or os.path.exists(self._legacy_log_file(date_str)):
+                self._compress_day(date_str)
+    
+    def _compress_day(self, date_str: str):
+        """合并某一天的全部记录，按时间排序写入压缩文件后删除原文件"""
+        # 先确保当天聚合已按原始日志计算好，压缩后只需更新对应的文件大小
+        self._get_day_stats(date_str)
+        compressed_file = self._compressed_log_file(date_str)
+        tmp_file = f"{compressed_file}.tmp"
+        with self._file_lock:
+            cases = sorted(self._iter_day(date_str), key=lambda c: c.get('timestamp', ''))
+            with gzip.open(tmp_file, 'wt', encoding='utf-8') as f:
+                for case in cases:
+                    f.write(json.dumps(case, ensure_ascii=False) + '\n')
+            with open(tmp_file, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_file, compressed_file)
+            for path in (self._log_file(date_str), self._legacy_log_file(date_str)):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        with self._stats_lock:
+            stats = self._day_stats.get(date_str)
+            if stats is not None:
+                stats.log_size = self._log_size(date_str)
+                self._save_day_stats(date_str, stats)
+        logger.info(f"紧急情况日志已压缩: {compressed_file} ({len(cases)} 条)")
+    
+    def get_recent_cases(self, days: int = 1, level: Optional[str] = None,
+                         user_id: Optional[str] = None, since: Optional[str] = None,
+                         until: Optional[str] = None, min_risk_score: Optional[float] = None,
+                         limit: int = 100, cursor: Optional[str] = None) -> Dict:
+        """
+        获取最近的紧急情况记录（按时间倒序，支持游标分页）
+
+        未指定 since 时取最近 days 天（含今天）；since/until 为ISO格式时间字符串。
+        统计信息按整天合并各日聚合，只按等级过滤。游标格式错误时抛出ValueError。
+        """
+        today = datetime.now()
+        if since is None:
+            since = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        index = self._get_index()
+        if since >= self._index_since:
+            cases, next_cursor = index.query(level, user_id, since, until, min_risk_score, limit, cursor)
+        else:
+            # 超出索引覆盖范围，流式读取日志
+            cases, next_cursor = self._scan_cases(level, user_id, since, until, min_risk_score, limit, cursor)
         
-        # 统计信息
-        stats = self._calculate_statistics(cases, days)
+        # 统计信息：合并统计周期内各日的聚合（先让队列中的记录落盘并计入聚合）
+        # 只取统计周期内实际有日志的日期，很早的 since 也不会逐日遍历
+        self.flush()
+        first_date = since[:10].replace('-', '')
+        last_date = min(until[:10].replace('-', ''), today.strftime('%Y%m%d')) if until else today.strftime('%Y%m%d')
+        dates = [d for d in self._log_dates() if first_date <= d <= last_date]
+        stats = self._calculate_statistics([self._get_day_stats(d) for d in dates], days, level)
         
         return {
             'statistics': stats,
-            'cases': cases[:100]  # 返回最多100条记录
+            'cases': cases,
+            'next_cursor': next_cursor
         }
     
-    def _calculate_statistics(self, cases: List[Dict], days: int) -> Dict[str, Any]:
-        """计算统计信息"""
+    def _get_day_stats(self, date_str: str) -> UrgentDayStats:
+        """
+        返回某一天的聚合统计
+
+        优先使用持久化的聚合文件；文件缺失（如旧版日志）或与日志大小不一致时，
+        从原始记录重新计算并保存。
+        """
+        with self._stats_lock:
+            stats = self._day_stats.get(date_str)
+            if stats is not None:
+                return stats
+            
+            log_size = self._log_size(date_str)
+            stats_file = self._stats_file(date_str)
+            if os.path.exists(stats_file):
+                try:
+                    with open(stats_file, 'r', encoding='utf-8') as f:
+                        stats = UrgentDayStats.from_dict(json.load(f))
+                    if stats.log_size != log_size:
+                        stats = None
+                except Exception as e:
+                    logger.warning(f"读取聚合统计失败 {stats_file}: {e}")
+                    stats = None
+            
+            if stats is None:
+                stats = UrgentDayStats.build(self._read_day(date_str)) if log_size else UrgentDayStats()
+                stats.log_size = log_size
+                if log_size:
+                    self._save_day_stats(date_str, stats)
+            self._day_stats[date_str] = stats
+            return stats
+    
+    def _update_day_stats(self, date_str: str, entries: List[Dict]):
+        """新记录写入日志后更新并保存当天聚合（在写线程中调用）"""
+        stats = self._get_day_stats(date_str)
+        with self._stats_lock:
+            for entry in entries:
+                stats.add(entry)
+            stats.log_size = self._log_size(date_str)
+            self._save_day_stats(date_str, stats)
+    
+    def _save_day_stats(self, date_str: str, stats: UrgentDayStats):
+        """原子地写入聚合文件"""
+        stats_file = self._stats_file(date_str)
+        tmp_file = f"{stats_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(stats.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_file, stats_file)
+        except Exception as e:
+            logger.error(f"保存聚合统计失败 {stats_file}: {e}")
+    
+    def _get_index(self) -> UrgentCaseIndex:
+        """返回查询索引，首次调用时从全部日志文件重建"""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    # 先让队列中的记录落盘，重建后新记录直接加入索引
+                    self.flush()
+                    first_day = datetime.now() - timedelta(days=self.index_days - 1)
+                    self._index_since = first_day.strftime('%Y-%m-%d')
+                    first_date = first_day.strftime('%Y%m%d')
+                    cases = []
+                    for date_str in self._log_dates():
+                        if date_str >= first_date:
+                            cases.extend(self._iter_day(date_str))
+                    self._index = UrgentCaseIndex.build(cases)
+                    logger.info(f"紧急情况索引已建立: {len(cases)} 条记录")
+        return self._index
+    
+    def _trim_index(self):
+        """
+        日期变化后丢弃索引中移出 index_days 天窗口的记录（持有 _index_lock 时调用）
+
+        先前移索引覆盖的起始日期再丢弃，查询不会在索引中漏掉已丢弃的记录。
+        """
+        since = (datetime.now() - timedelta(days=self.index_days - 1)).strftime('%Y-%m-%d')
+        if since <= self._index_since:
+            return
+        self._index_since = since
+        removed = self._index.trim(since)
+        if removed:
+            logger.info(f"紧急情况索引已丢弃 {since} 之前的 {removed} 条记录")
+    
+    def _scan_cases(self, level: Optional[str], user_id: Optional[str], since: str,
+                    until: Optional[str], min_risk_score: Optional[float], limit: int,
+                    cursor: Optional[str]):
+        """
+        从新到旧逐天流式读取日志并过滤，凑够一页后不再读取更早的日期
+
+        同一时间戳的记录按日志中的顺序排列，游标记录上一页最后的时间戳 t，
+        以及该时间戳已返回的条数 k，翻页时跳过这些记录，跨页的同时间戳记录不会遗漏。
+        返回 (记录列表, 下一页游标)。
+        """
+        before, skip = None, None
+        if cursor:
+            data = decode_cursor(cursor)
+            before, skip = data.get('t'), data.get('k')
+            if not isinstance(before, str) or not (skip is None or isinstance(skip, int)):
+                raise ValueError("无效的分页游标")
+        first_date = since[:10].replace('-', '')
+        last_dates = [value[:10].replace('-', '') for value in (until, before) if value]
+        last_date = min(last_dates) if last_dates else '99999999'
+        # 不带 k 的游标（如索引查询的游标）不含该时间戳的其余记录
+        remaining_skip = skip if skip is not None else 0
+        
+        matches: List[Dict] = []
+        for date_str in reversed(self._log_dates()):
+            if date_str > last_date:
+                continue
+            if date_str < first_date or len(matches) > limit:
+                break
+            day_matches = [
+                case for case in self._iter_day(date_str)
+                if case.get('timestamp', '') >= since
+                and (until is None or case.get('timestamp', '') < until)
+                and (before is None or case.get('timestamp', '') < before
+                     or (skip is not None and case.get('timestamp', '') == before))
+                and (level is None or case.get('urgent_level') == level)
+                and (user_id is None or case.get('user_id') == user_id)
+                and (min_risk_score is None or case.get('risk_score', 0) >= min_risk_score)
+            ]
+            day_matches.sort(key=lambda c: c.get('timestamp', ''), reverse=True)
+            skipped = 0
+            while skipped < min(remaining_skip, len(day_matches)) \
+                    and day_matches[skipped].get('timestamp', '') == before:
+                skipped += 1
+            remaining_skip -= skipped
+            matches.extend(day_matches[skipped:])
+        
+        next_cursor = None
+        if len(matches) > limit:
+            matches = matches[:limit]
+            last = matches[-1].get('timestamp', '')
+            count = sum(1 for case in matches if case.get('timestamp', '') == last)
+            if last == before:
+                count += skip or 0
+            next_cursor = encode_cursor({'t': last, 'k': count})
+        return matches, next_cursor
+    
+    def _log_dates(self) -> List[str]:
+        """日志目录中有记录的日期（升序）"""
+        dates = set()
+        for name in os.listdir(self.log_dir):
+            match = self.LOG_FILE_PATTERN.match(name)
+            if match:
+                dates.add(match.group(1))
+        return sorted(dates)
+    
+    def _calculate_statistics(self, day_stats: List[UrgentDayStats], days: int,
+                              level: Optional[str] = None) -> Dict[str, Any]:
+        """合并各日聚合为统计信息（指定 level 时只统计该等级）"""
+        counts: Dict[str, int] = {}
+        risk_sum = 0.0
+        hourly = [0] * 24
+        for stats in day_stats:
+            for lvl, count in stats.counts.items():
+                if level and lvl != level:
+                    continue
+                counts[lvl] = counts.get(lvl, 0) + count
+                risk_sum += stats.risk_sums.get(lvl, 0.0)
+                for hour, hour_count in enumerate(stats.hourly.get(lvl, [])):
+                    hourly[hour] += hour_count
+        total = sum(counts.values())
         return {
-            'total_cases': len(cases),
-            'urgent_count': len([c for c in cases if c['urgent_level'] == 'urgent']),
-            'warning_high_count': len([c for c in cases if c['urgent_level'] == 'warning_high']),
-            'warning_count': len([c for c in cases if c['urgent_level'] == 'warning']),
+            'total_cases': total,
+            'urgent_count': counts.get('urgent', 0),
+            'warning_high_count': counts.get('warning_high', 0),
+            'warning_count': counts.get('warning', 0),
             'period_days': days,
-            'avg_risk_score': sum(c.get('risk_score', 0) for c in cases) / max(len(cases), 1)
+            'avg_risk_score': risk_sum / max(total, 1),
+            'hourly_counts': hourly
         }
 
 
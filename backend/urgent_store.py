@@ -0,0 +1,182 @@
+import bisect
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils import encode_cursor, decode_cursor
+
+
+class UrgentCaseIndex:
+    """
+    紧急情况记录的内存索引
+
+    记录按时间升序存放，另按风险等级、用户ID维护位置列表（同样升序）。
+    时间范围用二分查找定位，等级/用户过滤直接取对应的位置列表，
+    从新到旧遍历、凑够一页即停止，查询耗时与历史总量基本无关。
+    新记录通常按时间追加；偶尔乱序插入时重建位置列表。
+    """
+
+    def __init__(self):
+        self._cases: List[Dict[str, Any]] = []
+        self._timestamps: List[str] = []
+        self._by_level: Dict[str, List[int]] = {}
+        self._by_user: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, cases: Iterable[Dict[str, Any]]) -> "UrgentCaseIndex":
+        """从日志记录全量构建"""
+        index = cls()
+        index._cases = sorted(cases, key=lambda c: c.get('timestamp', ''))
+        index._reindex()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._cases)
+
+    def add(self, case: Dict[str, Any]):
+        """添加一条记录"""
+        timestamp = case.get('timestamp', '')
+        with self._lock:
+            if not self._timestamps or timestamp >= self._timestamps[-1]:
+                position = len(self._cases)
+                self._cases.append(case)
+                self._timestamps.append(timestamp)
+                self._by_level.setdefault(case.get('urgent_level'), []).append(position)
+                self._by_user.setdefault(case.get('user_id'), []).append(position)
+            else:
+                position = bisect.bisect_right(self._timestamps, timestamp)
+                self._cases.insert(position, case)
+                self._reindex()
+
+    def trim(self, before: str) -> int:
+        """丢弃时间早于 before 的记录，返回丢弃的条数"""
+        with self._lock:
+            count = bisect.bisect_left(self._timestamps, before)
+            if count:
+                del self._cases[:count]
+                self._reindex()
+            return count
+
+    def query(self, level: Optional[str] = None, user_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None,
+              min_risk_score: Optional[float] = None, limit: int = 100,
+              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按条件从新到旧查询一页记录
+
+        since/until 为ISO格式时间字符串（since 含、until 不含）。
+        返回 (记录列表, 下一页游标)，没有更多记录时游标为 None；游标格式错误时抛出ValueError。
+        """
+        with self._lock:
+            lo = bisect.bisect_left(self._timestamps, since) if since else 0
+            hi = bisect.bisect_left(self._timestamps, until) if until else len(self._cases)
+            if cursor:
+                hi = min(hi, self._cursor_position(decode_cursor(cursor)))
+
+            # 选较短的位置列表遍历，另一个条件逐条检查
+            positions = None
+            check_level = check_user = False
+            if level is not None:
+                positions = self._by_level.get(level, [])
+            if user_id is not None:
+                user_positions = self._by_user.get(user_id, [])
+                if positions is None or len(user_positions) < len(positions):
+                    check_level = positions is not None
+                    positions = user_positions
+                else:
+                    check_user = True
+
+            if positions is None:
+                candidates = range(hi - 1, lo - 1, -1)
+            else:
+                start = bisect.bisect_left(positions, lo)
+                end = bisect.bisect_left(positions, hi)
+                candidates = (positions[i] for i in range(end - 1, start - 1, -1))
+
+            page: List[int] = []
+            for position in candidates:
+                case = self._cases[position]
+                if check_level and case.get('urgent_level') != level:
+                    continue
+                if check_user and case.get('user_id') != user_id:
+                    continue
+                if min_risk_score is not None and case.get('risk_score', 0) < min_risk_score:
+                    continue
+                page.append(position)
+                if len(page) > limit:
+                    break
+
+            next_cursor = None
+            if len(page) > limit:
+                page = page[:limit]
+                last = page[-1]
+                next_cursor = encode_cursor({'t': self._timestamps[last], 'p': last})
+            return [self._cases[position] for position in page], next_cursor
+
+    def _cursor_position(self, data: Dict[str, Any]) -> int:
+        """游标对应的位置（不含）；索引重建导致位置变化时按时间重新定位"""
+        timestamp, position = data.get('t'), data.get('p')
+        if not isinstance(timestamp, str):
+            raise ValueError("无效的分页游标")
+        if isinstance(position, int) and 0 <= position < len(self._cases) \
+                and self._timestamps[position] == timestamp:
+            return position
+        return bisect.bisect_left(self._timestamps, timestamp)
+
+    def _reindex(self):
+        """重建时间列表和位置列表"""
+        self._timestamps = [case.get('timestamp', '') for case in self._cases]
+        self._by_level = {}
+        self._by_user = {}
+        for position, case in enumerate(self._cases):
+            self._by_level.setdefault(case.get('urgent_level'), []).append(position)
+            self._by_user.setdefault(case.get('user_id'), []).append(position)
+
+
+class UrgentDayStats:
+    """
+    单日紧急情况聚合：各等级的记录数、风险分总和与按小时分布
+
+    记录写入日志后增量更新，多日统计直接合并各日聚合，不需要读取原始记录。
+    log_size 为生成聚合时对应日志文件的字节数，用于判断持久化的聚合是否与日志一致。
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.risk_sums: Dict[str, float] = {}
+        self.hourly: Dict[str, List[int]] = {}
+        self.log_size = 0
+
+    @classmethod
+    def build(cls, cases: Iterable[Dict[str, Any]]) -> "UrgentDayStats":
+        stats = cls()
+        for case in cases:
+            stats.add(case)
+        return stats
+
+    def add(self, case: Dict[str, Any]):
+        level = case.get('urgent_level')
+        self.counts[level] = self.counts.get(level, 0) + 1
+        self.risk_sums[level] = self.risk_sums.get(level, 0.0) + case.get('risk_score', 0)
+        hours = self.hourly.setdefault(level, [0] * 24)
+        try:
+            hours[int(case.get('timestamp', '')[11:13])] += 1
+        except (ValueError, IndexError):
+            pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'counts': self.counts,
+            'risk_sums': self.risk_sums,
+            'hourly': self.hourly,
+            'log_size': self.log_size
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UrgentDayStats":
+        stats = cls()
+        stats.counts = dict(data.get('counts', {}))
+        stats.risk_sums = dict(data.get('risk_sums', {}))
+        stats.hourly = {level: list(hours) for level, hours in data.get('hourly', {}).items()}
+        stats.log_size = data.get('log_size', 0)
+        return stats
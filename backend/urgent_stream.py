@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class UrgentSubscription:
+    """
+    单个订阅者的有界事件队列
+
+    队列满时丢弃最旧的事件并计数，慢客户端不会让内存无限增长；
+    丢弃情况以 dropped 事件告知客户端，由其通过 /urgent/cases 补齐。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, buffer_size: int, level: Optional[str] = None):
+        self.loop = loop
+        self.level = level
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        return self.level is None or event.get('urgent_level') == self.level
+
+    def put(self, event: Dict[str, Any]):
+        """放入事件（在订阅者所在的事件循环中调用）"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class UrgentEventBroker:
+    """
+    紧急情况事件的进程内发布/订阅
+
+    publish 可在任意线程调用，通过 call_soon_threadsafe 投递到各订阅者的事件循环，
+    不阻塞发布方。另保留最近的事件，客户端重连时按 Last-Event-ID 补发。
+    """
+
+    def __init__(self, buffer_size: int = 100, heartbeat: float = 15.0):
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self._subscribers: List[UrgentSubscription] = []
+        self._recent: deque = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: Dict[str, Any]):
+        """发布事件给所有订阅者"""
+        with self._lock:
+            event = dict(event, event_id=next(self._ids), published_at=time.time())
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self.unsubscribe(subscription)
+
+    def subscribe(self, level: Optional[str] = None, last_event_id: Optional[int] = None) -> UrgentSubscription:
+        """在当前事件循环中订阅，last_event_id 之后的近期事件先放入队列"""
+        subscription = UrgentSubscription(asyncio.get_running_loop(), self.buffer_size, level)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._recent:
+                    if event['event_id'] > last_event_id and subscription.matches(event):
+                        subscription.put(event)
+            self._subscribers.append(subscription)
+        logger.info(f"紧急情况推送订阅: 当前订阅数={len(self._subscribers)}")
+        return subscription
+
+    def unsubscribe(self, subscription: UrgentSubscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    async def stream(self, subscription: UrgentSubscription) -> AsyncIterator[str]:
+        """按 Server-Sent Events 格式输出订阅的事件，空闲时发送心跳注释"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'count': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                data = json.dumps(event, ensure_ascii=False)
+                yield f"id: {event['event_id']}\nevent: urgent\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+# 全局实例
+urgent_broker = UrgentEventBroker(config.URGENT_STREAM_BUFFER, config.URGENT_STREAM_HEARTBEAT)
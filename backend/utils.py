@@ -1,7 +1,12 @@
 import logging
-from typing import Any, Dict
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 import json
+import base64
+
+import numpy as np
 
 def setup_logging(log_level: str = "INFO"):
     """设置日志配置"""
@@ -69,4 +74,123 @@ def calculate_support_score(conversation_summary: Dict) -> float:
     if conversation_summary['primary_emotion'] in ['焦虑', '抑郁', '愤怒']:
         score -= 1.0
     
-    return max(0.0, min(10.0, score))
\ No newline at end of file
+    return max(0.0, min(10.0, score))
+
+
+def record_field(record: Any, name: str, default: Any = None) -> Any:
+    """读取内容记录字段，兼容原始dict和ContentItem模型"""
+    if isinstance(record, dict):
+        value = record.get(name, default)
+    else:
+        value = getattr(record, name, default)
+    return default if value is None else value
+
+
+def record_text(record: Any, name: str) -> str:
+    """读取文本字段，类型不符时视为空字符串（建索引时不因个别记录中断）"""
+    value = record_field(record, name, '')
+    return value if isinstance(value, str) else ''
+
+
+def record_strings(record: Any, name: str) -> List[str]:
+    """读取字符串列表字段，忽略非字符串元素"""
+    values = record_field(record, name, [])
+    return [value for value in values if isinstance(value, str)] if isinstance(values, list) else []
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """将分页位置编码为不透明的游标字符串"""
+    raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解析游标字符串，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(data, dict):
+        raise ValueError("无效的分页游标")
+    return data
+
+
+class FileWatcher:
+    """
+    文件变更监视器
+
+    后台线程轮询文件的修改时间，变化时调用回调（在监视线程中执行）。
+    自身写入文件后可调用 mark_seen 避免触发回调。
+    """
+
+    def __init__(self, path: str, callback: Callable[[], None], interval: float = 5.0, name: str = "file-watcher"):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.name = name
+        self._last_mtime = self._current_mtime()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def mark_seen(self):
+        """记录当前修改时间为已处理"""
+        self._last_mtime = self._current_mtime()
+
+    def changed(self) -> bool:
+        """文件在上次记录后是否被修改"""
+        return self._current_mtime() != self._last_mtime
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._last_mtime:
+                continue
+            self._last_mtime = mtime
+            try:
+                self.callback()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"文件变更处理失败 {self.path}: {e}")
+
+
+class GrowableArray:
+    """按需倍增容量的一维数组"""
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self._data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            capacity = max(needed, len(self._data) * 2)
+            data = np.zeros(capacity, dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    def copy(self) -> "GrowableArray":
+        clone = GrowableArray(self._data.dtype, 0)
+        clone._data = self._data.copy()
+        clone.size = self.size
+        return clone
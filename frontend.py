@@ -107,6 +107,32 @@ def show_urgent_warning(urgent_issue):
         return True
     return False
 
+def fetch_recommendations(wait_seconds=0.0, interval=0.5):
+    """获取后台生成的推荐，生成中时最多等待 wait_seconds 秒；拿到新推荐时返回True"""
+    url = f"{st.session_state.api_base}/session/{st.session_state.user_id}/{st.session_state.session_id}/recommendations"
+    deadline = time.time() + wait_seconds
+    while True:
+        try:
+            resp = requests.get(url, timeout=3)
+            if resp.status_code != 200:
+                st.session_state.recommendations_pending = False
+                return False
+            result = resp.json()
+        except requests.exceptions.RequestException:
+            return False
+        
+        if result.get("status") != "pending":
+            st.session_state.recommendations_pending = False
+            if result.get("status") == "ready" and result.get("recommendations"):
+                st.session_state.latest_recommendations = result["recommendations"]
+                st.session_state.recommendation_rationale = result.get("rationale", "")
+                return True
+            return False
+        
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+
 # ------------------ 页面配置 ------------------
 st.set_page_config(
     page_title="心灵伙伴 Pro",
@@ -135,6 +161,8 @@ if "latest_recommendations" not in st.session_state:  # 新增：推荐内容
     st.session_state.latest_recommendations = []
 if "recommendation_rationale" not in st.session_state:  # 新增：推荐理由
     st.session_state.recommendation_rationale = ""
+if "recommendations_pending" not in st.session_state:  # 推荐在后台生成中
+    st.session_state.recommendations_pending = False
 
 # ------------------ 侧边栏配置 ------------------
 with st.sidebar:
@@ -254,6 +282,7 @@ with st.sidebar:
             st.session_state.chat_history = []
             st.session_state.session_id = f"session_{int(time.time())}_{uuid.uuid4().hex[:8]}"
             st.session_state.conversation_summary = {}
+            st.session_state.recommendations_pending = False
             
             # 通知后端清除旧会话
             try:
@@ -406,9 +435,10 @@ if user_input:
                         st.session_state.chat_history[temp_message_id]["current_emotion"] = emotion_summary.get("current_emotion", "未知")
                         st.session_state.chat_history[temp_message_id]["context_emotion"] = emotion_summary.get("context_emotion", "未知")
                     
-                    # 保存推荐内容
+                    # 保存推荐内容（推荐在后台生成时，页面渲染完成后再获取）
                     st.session_state.latest_recommendations = recommendations
                     st.session_state.recommendation_rationale = recommendation_rationale
+                    st.session_state.recommendations_pending = chat_result.get("recommendations_pending", False)
                     
                     # 保存AI回复到历史
                     ai_message_data = {
@@ -506,6 +536,12 @@ with st.expander("ℹ️ 关于此系统", expanded=False):
     **版本**: Pro v3.0 (上下文感知版)
     """)
 
+# ------------------ 获取后台推荐 ------------------
+# 放在页面末尾：等待推荐时对话内容已经显示出来
+if st.session_state.recommendations_pending:
+    if fetch_recommendations(wait_seconds=5):
+        st.rerun()
+
 # ------------------ 自动刷新对话状态 ------------------
 # 每60秒自动刷新一次对话状态（如果对话活跃）
 if st.session_state.chat_history and len(st.session_state.chat_history) > 0: